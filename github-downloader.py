@@ -1,17 +1,500 @@
 import sys
 import os
+import re
 import threading
+import socket
+import weakref
 import time
+import zlib
+import multiprocessing
+from collections import deque
+import mmap
+import hashlib
+import struct
+import tarfile
+import zipfile
+import fnmatch
+import shutil
 import requests
+from datetime import datetime, timezone
+from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from itertools import accumulate, cycle
+try:
+    import httpx
+except ImportError:
+    httpx = None
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QLineEdit, QComboBox, QSlider, QPushButton, QTextEdit,
     QProgressBar, QFileDialog, QFrame, QGridLayout,
-    QSizePolicy
+    QSizePolicy, QCheckBox, QSpinBox
 )
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtCore import Qt, QThread, QObject, pyqtSignal
 from PyQt5.QtGui import QFont, QIcon
 import json
+import secrets
+import hmac
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SUPPORTED_PREFIXES = (
+    'https://github.com/',
+    'https://raw.githubusercontent.com/',
+    'https://codeload.github.com/',
+)
+
+PROXY_PREFIXES = (
+    ("ghfast.top", "https://ghfast.top/"),
+    ("gh-proxy.net", "https://gh-proxy.net/"),
+    ("直连", ""),
+)
+
+def accelerate_url(original_url, prefix):
+    """构建加速链接, 不支持的链接返回None"""
+    if original_url.startswith(SUPPORTED_PREFIXES):
+        return prefix + original_url[8:]
+    return None
+
+def default_file_name(original_url):
+    """从链接生成保存的文件名"""
+    file_name = os.path.basename(original_url.split('?')[0])
+    if not file_name:
+        file_name = f"download_{int(time.time())}.zip"
+    return file_name
+
+def stage_verify(path, expected=None):
+    """后处理: 计算SHA-256, 给出期望值时校验"""
+    digest = hashlib.sha256()
+    if os.path.getsize(path):
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            for start in range(0, len(data), 16 * 1024 * 1024):
+                digest.update(data[start:start + 16 * 1024 * 1024])
+    if expected and digest.hexdigest() != expected.lower():
+        raise ValueError(f"SHA-256校验失败: {os.path.basename(path)}")
+    return path, f"SHA-256: {digest.hexdigest()}"
+
+def stage_extract(path, target=None):
+    """后处理: 解压zip或tar压缩包, 之后的步骤作用于解压目录"""
+    if target is None:
+        # 只去掉文件名的扩展名, 目录名中的点保持不变
+        folder, name = os.path.split(path)
+        stem, ext = os.path.splitext(name)
+        if stem.endswith('.tar'):
+            stem = stem[:-len('.tar')]
+        target = os.path.join(folder, stem) if ext and stem else path + '_files'
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            archive.extractall(target)
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as archive:
+            if hasattr(tarfile, 'data_filter'):
+                archive.extractall(target, filter='data')
+            else:
+                archive.extractall(target)
+    else:
+        raise ValueError(f"不是压缩包: {os.path.basename(path)}")
+    return target, f"已解压到: {target}"
+
+def stage_move(path, target):
+    """后处理: 移动到目标文件夹"""
+    os.makedirs(target, exist_ok=True)
+    destination = shutil.move(path, os.path.join(target, os.path.basename(path)))
+    return destination, f"已移动到: {destination}"
+
+POST_STAGES = {
+    'verify': stage_verify,
+    'extract': stage_extract,
+    'move': stage_move,
+}
+
+def parse_post_stages(text):
+    """解析后处理步骤, 格式如 "verify, extract, move:目标文件夹" """
+    stages = []
+    if not isinstance(text, (str, list)):
+        raise ValueError("后处理步骤必须是字符串或字符串列表")
+    for item in (text if isinstance(text, list) else text.split(',')):
+        if not isinstance(item, str):
+            raise ValueError("后处理步骤必须是字符串或字符串列表")
+        item = item.strip()
+        if not item:
+            continue
+        name, _, arg = item.partition(':')
+        if name.strip() not in POST_STAGES:
+            raise ValueError(f"未知的后处理步骤: {name}")
+        stages.append((name.strip(), arg.strip() or None))
+    return stages
+
+def run_pipeline(path, stages):
+    """在子进程中依次执行后处理步骤, 只传递文件路径"""
+    messages = []
+    for name, arg in stages:
+        path, message = POST_STAGES[name](path, arg) if arg else POST_STAGES[name](path)
+        messages.append(message)
+    return messages
+
+class PostProcessor(QObject):
+    """下载后处理流水线, 在进程池中执行, 不占用下载线程的GIL"""
+    log_signal = pyqtSignal(str, str)
+    RULES_FILE = "post_pipeline.json"
+    
+    def __init__(self, max_workers=None):
+        super().__init__()
+        self.max_workers = max_workers
+        self.executor = None
+    
+    def stages_for(self, path, stages=None):
+        """任务指定的步骤优先, 否则按文件名匹配规则文件; 规则文件格式错误时抛出ValueError"""
+        if stages:
+            return parse_post_stages(stages)
+        try:
+            with open(self.RULES_FILE, "r", encoding="utf-8") as f:
+                rules = json.load(f)
+        except FileNotFoundError:
+            return []
+        except (OSError, ValueError) as e:
+            raise ValueError(f"无法读取后处理规则文件 {self.RULES_FILE}: {str(e)}")
+        if not isinstance(rules, list) or not all(
+                isinstance(rule, dict) and isinstance(rule.get('pattern'), str) and 'stages' in rule
+                for rule in rules):
+            raise ValueError(f"后处理规则文件 {self.RULES_FILE} 格式错误, "
+                             f"应为 [{{\"pattern\": \"*.zip\", \"stages\": \"verify, extract\"}}]")
+        for rule in rules:
+            if fnmatch.fnmatch(os.path.basename(path), rule['pattern']):
+                return parse_post_stages(rule['stages'])
+        return []
+    
+    def submit(self, path, stages=None, on_done=None):
+        """提交后处理任务, 没有需要执行的步骤时返回None"""
+        try:
+            stages = self.stages_for(path, stages)
+        except ValueError as e:
+            self.log_signal.emit(str(e), "error")
+            return None
+        if not stages:
+            return None
+        if self.executor is None:
+            # 进程池在下载线程中按需创建, fork会复制其他线程持有的锁, 因此用spawn启动子进程
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                mp_context=multiprocessing.get_context('spawn'))
+        name = os.path.basename(path)
+        self.log_signal.emit(f"开始后处理: {name} ({', '.join(s[0] for s in stages)})", "info")
+        future = self.executor.submit(run_pipeline, path, stages)
+        
+        def done(future):
+            try:
+                messages = future.result()
+            except Exception as e:
+                self.log_signal.emit(f"后处理失败: {name}: {str(e)}", "error")
+                if on_done:
+                    on_done(False, [str(e)])
+                return
+            for message in messages:
+                self.log_signal.emit(message, "info")
+            self.log_signal.emit(f"后处理完成: {name}", "success")
+            if on_done:
+                on_done(True, messages)
+        
+        future.add_done_callback(done)
+        return future
+    
+    def shutdown(self):
+        """关闭进程池"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+class DownloadCancelled(Exception):
+    """下载被取消"""
+
+class StreamReader:
+    """网络流读取器, 读取时统计已下载字节"""
+    def __init__(self, raw, on_read):
+        self.raw = raw
+        self.on_read = on_read
+        
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        if data:
+            self.on_read(len(data))
+        return data
+    
+    def read_exact(self, size):
+        """读取指定长度的数据"""
+        buf = bytearray()
+        while len(buf) < size:
+            data = self.read(min(size - len(buf), 65536))
+            if not data:
+                raise EOFError("压缩包数据不完整")
+            buf += data
+        return bytes(buf)
+    
+    def skip(self, size):
+        """跳过指定长度的数据"""
+        while size > 0:
+            data = self.read(min(size, 65536))
+            if not data:
+                raise EOFError("压缩包数据不完整")
+            size -= len(data)
+
+class Http2Response:
+    """把httpx的流式响应包装成requests风格的接口"""
+    def __init__(self, client, url, headers):
+        self.response = client.send(client.build_request('GET', url, headers=headers), stream=True)
+        self.status_code = self.response.status_code
+        self.headers = self.response.headers
+        
+    def raise_for_status(self):
+        self.response.raise_for_status()
+    
+    def iter_content(self, chunk_size):
+        return self.response.iter_bytes(chunk_size)
+    
+    def close(self):
+        self.response.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *args):
+        self.close()
+
+class WriteBehindWriter:
+    """后台写盘线程, 合并相邻数据块后顺序写入, 积压过多时让接收线程等待"""
+    def __init__(self, memory_budget=32 * 1024 * 1024, fsync_policy='end', fsync_interval=64 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.pending = 0
+        self.files = {}
+        self.unsynced = {}
+        self.closed = False
+        self.error = None
+        self.disk_wait = 0.0
+        self.write_time = 0.0
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def write(self, path, offset, data):
+        """提交一块数据, 超出内存预算时阻塞"""
+        with self.cond:
+            if self.pending and self.pending + len(data) > self.memory_budget:
+                start = time.time()
+                while self.pending and self.pending + len(data) > self.memory_budget and not self.error:
+                    self.cond.wait()
+                self.disk_wait += time.time() - start
+            if self.error:
+                raise self.error
+            self.queue.append((path, offset, data))
+            self.pending += len(data)
+            self.cond.notify_all()
+    
+    def run(self):
+        """写盘线程主循环"""
+        while True:
+            with self.cond:
+                while not self.queue and not self.closed:
+                    self.cond.wait()
+                if not self.queue:
+                    break
+                batch = list(self.queue)
+                self.queue.clear()
+            try:
+                start = time.time()
+                for path, offset, chunks in self.coalesce(batch):
+                    self.write_chunks(path, offset, chunks)
+                self.write_time += time.time() - start
+            except Exception as e:
+                with self.cond:
+                    self.error = e
+            with self.cond:
+                self.pending -= sum(len(data) for _, _, data in batch)
+                self.cond.notify_all()
+    
+    def coalesce(self, batch):
+        """把同一文件中首尾相接的数据块合并成一次写入"""
+        merged = []
+        for path, offset, data in sorted(batch, key=lambda item: (item[0], item[1])):
+            last = merged[-1] if merged else None
+            if last and last[0] == path and last[1] + last[3] == offset:
+                last[2].append(data)
+                last[3] += len(data)
+            else:
+                merged.append([path, offset, [data], len(data)])
+        return [(path, offset, chunks) for path, offset, chunks, _ in merged]
+    
+    def write_chunks(self, path, offset, chunks):
+        """写入合并后的数据块, 按策略执行fsync"""
+        if self.error:
+            return
+        f = self.files.get(path)
+        if f is None:
+            f = self.files[path] = open(path, 'r+b' if os.path.exists(path) else 'wb')
+            self.unsynced[path] = 0
+        f.seek(offset)
+        data = b''.join(chunks)
+        f.write(data)
+        self.unsynced[path] += len(data)
+        if self.fsync_policy == 'interval' and self.unsynced[path] >= self.fsync_interval:
+            f.flush()
+            os.fsync(f.fileno())
+            self.unsynced[path] = 0
+    
+    def close(self):
+        """写完剩余数据并关闭文件"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        for path, f in self.files.items():
+            try:
+                if self.fsync_policy != 'none' and self.unsynced[path] and not self.error:
+                    f.flush()
+                    os.fsync(f.fileno())
+                f.close()
+            except Exception as e:
+                self.error = self.error or e
+        self.files.clear()
+
+class BlockManifest:
+    """块校验清单, 用于增量更新"""
+    DEFAULT_BLOCK_SIZE = 64 * 1024
+    # 纯Python逐字节滚动约每秒1MB, 滚动超过这个字节数后剩下的块直接下载
+    ROLLING_SCAN_LIMIT = 4 * 1024 * 1024
+    
+    def __init__(self, block_size, length, blocks, sha256=None):
+        self.block_size = block_size
+        self.length = length
+        self.blocks = blocks
+        self.sha256 = sha256
+    
+    @classmethod
+    def from_file(cls, path, block_size=DEFAULT_BLOCK_SIZE):
+        """计算文件的块校验清单"""
+        blocks = []
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    break
+                digest.update(block)
+                blocks.append([cls.weak_checksum(block), hashlib.md5(block).hexdigest()])
+        return cls(block_size, os.path.getsize(path), blocks, digest.hexdigest())
+    
+    @classmethod
+    def from_json(cls, data):
+        """从发布的清单数据创建"""
+        return cls(data['block_size'], data['length'], data['blocks'], data.get('sha256'))
+    
+    def to_json(self):
+        """导出为可发布的清单数据"""
+        return {
+            'block_size': self.block_size,
+            'length': self.length,
+            'sha256': self.sha256,
+            'blocks': self.blocks,
+        }
+    
+    @staticmethod
+    def weak_checksum(block):
+        """rsync风格的弱校验和"""
+        a = sum(block) & 0xFFFF
+        b = sum(accumulate(block)) & 0xFFFF
+        return a | (b << 16)
+    
+    def block_range(self, index):
+        """块在新文件中的字节范围"""
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.length) - 1
+    
+    def match(self, path, is_running=lambda: True):
+        """在旧文件中查找可复用的块, 返回 {块序号: 旧文件偏移}; is_running返回False时抛出DownloadCancelled"""
+        found = {}
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return found
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                # 先直接用MD5比较对齐位置, 文件末尾追加内容时无需滚动查找
+                for index, (weak, strong) in enumerate(self.blocks):
+                    if not is_running():
+                        raise DownloadCancelled()
+                    start, end = self.block_range(index)
+                    block = data[start:end + 1]
+                    if len(block) == end - start + 1 and hashlib.md5(block).hexdigest() == strong:
+                        found[index] = start
+                
+                wanted = {}
+                for index, (weak, strong) in enumerate(self.blocks):
+                    start, end = self.block_range(index)
+                    if index not in found and end - start + 1 == self.block_size:
+                        wanted.setdefault(weak, []).append(index)
+                if wanted and size >= self.block_size:
+                    self.rolling_match(data, size, wanted, found, is_running)
+        return found
+    
+    def rolling_match(self, data, size, wanted, found, is_running):
+        """滚动校验查找发生偏移的块, 逐字节滚动最多ROLLING_SCAN_LIMIT次
+        
+        只在未匹配的区域滚动; 找到一个块后, 后续的块通常紧接着出现, 直接用MD5比较, 不必重新计算弱校验和
+        """
+        block_size = self.block_size
+        budget = self.ROLLING_SCAN_LIMIT
+        # 已在对齐位置匹配的区域直接跳过
+        matched = set(found.values())
+        pos = 0
+        a = b = None
+        while pos + block_size <= size:
+            if pos in matched:
+                pos += block_size
+                a = None
+                continue
+            if a is None:
+                if not is_running():
+                    raise DownloadCancelled()
+                block = data[pos:pos + block_size]
+                a = sum(block) & 0xFFFF
+                b = sum(accumulate(block)) & 0xFFFF
+            hits = None
+            candidates = wanted.get(a | (b << 16))
+            if candidates:
+                strong = hashlib.md5(data[pos:pos + block_size]).hexdigest()
+                hits = [index for index in candidates if self.blocks[index][1] == strong]
+            if hits:
+                for index in hits:
+                    self.take_wanted(wanted, index)
+                    found[index] = pos
+                pos += block_size
+                index = hits[-1] + 1
+                while (index < len(self.blocks) and index in wanted.get(self.blocks[index][0], ())
+                       and pos + block_size <= size
+                       and hashlib.md5(data[pos:pos + block_size]).hexdigest() == self.blocks[index][1]):
+                    self.take_wanted(wanted, index)
+                    found[index] = pos
+                    pos += block_size
+                    index += 1
+                if not wanted:
+                    return
+                a = None
+                continue
+            budget -= 1
+            if pos + block_size >= size or budget == 0:
+                return
+            if budget & 0xFFFF == 0 and not is_running():
+                raise DownloadCancelled()
+            out_byte = data[pos]
+            a = (a - out_byte + data[pos + block_size]) & 0xFFFF
+            b = (b - block_size * out_byte + a) & 0xFFFF
+            pos += 1
+    
+    def take_wanted(self, wanted, index):
+        """从待查找的块中移除已找到的块"""
+        weak = self.blocks[index][0]
+        wanted[weak].remove(index)
+        if not wanted[weak]:
+            del wanted[weak]
 
 class DownloadThread(QThread):
     """下载线程类"""
@@ -20,21 +503,65 @@ class DownloadThread(QThread):
     speed_signal = pyqtSignal(float)
     finished_signal = pyqtSignal(bool, str)
     
-    def __init__(self, url, save_path, threads=4):
+    # 原始链接 -> (最终地址, 过期时间), 所有下载共享
+    redirect_cache = {}
+    redirect_lock = threading.Lock()
+    REDIRECT_TTL = 300
+    
+    # 可压缩传输的内容类型, 以及压缩单连接下载的大小上限
+    COMPRESSIBLE_TYPES = ('text/', 'json', 'xml', 'javascript', 'csv', 'yaml')
+    COMPRESS_MAX_SIZE = 32 * 1024 * 1024
+    
+    # 旧文件中可复用的数据低于这个比例时, 增量更新不如直接完整下载
+    DELTA_MIN_REUSE = 0.1
+    
+    # 停止后等待工作线程退出的最长时间(秒)
+    STOP_TIMEOUT = 2
+    
+    def __init__(self, url, save_path, threads=4, extract_dir=None, members=None, base_file=None,
+                 use_http2=False, http2_connections=1, write_buffer=32 * 1024 * 1024, fsync_policy='end'):
         super().__init__()
         self.url = url
         self.save_path = save_path
         self.threads = threads
+        self.extract_dir = extract_dir
+        self.members = members
+        self.base_file = base_file
+        self.use_http2 = use_http2
+        self.http2_connections = http2_connections
+        self.http2_clients = []
+        self.next_http2_client = None
+        self.write_buffer = write_buffer
+        self.fsync_policy = fsync_policy
+        self.writer = None
+        self.network_wait = 0.0
+        self.paused = False
+        self.stop_time = None
+        self.parts = []
+        self.resume_parts = False
+        self.active_responses = weakref.WeakSet()
+        self.response_lock = threading.Lock()
         self.is_running = True
         self.total_size = 0
         self.downloaded_size = 0
+        self.wire_size = 0
+        self.compressed = False
         self.start_time = None
         self.last_downloaded = 0
         
     def run(self):
+        if self.members:
+            self.run_select()
+            return
+        if self.extract_dir:
+            self.run_extract()
+            return
+        if self.base_file and self.run_delta():
+            return
         try:
             self.start_time = time.time()
-            response = requests.head(self.url, allow_redirects=True, timeout=10)
+            response = self.head_probe()
+            self.cache_resolved(str(response.url))
             if 'Content-Length' in response.headers:
                 self.total_size = int(response.headers['Content-Length'])
                 self.log_signal.emit(f"文件大小: {self.format_size(self.total_size)}", "info")
@@ -50,29 +577,43 @@ class DownloadThread(QThread):
             
             self.log_signal.emit(f"开始下载: {os.path.basename(self.url) if not filename else filename}", "info")
             
-            part_size = self.total_size // self.threads
+            self.parts = self.load_state()
+            if not self.parts and self.prefer_compressed(response.headers.get('Content-Type', '')):
+                self.download_compressed()
+                return
+            if self.parts:
+                self.resume_parts = True
+                self.log_signal.emit("发现未完成的下载, 继续上次的进度", "info")
+            else:
+                part_size = self.total_size // self.threads
+                for i in range(self.threads):
+                    start = i * part_size
+                    end = (i + 1) * part_size - 1 if i != self.threads - 1 else self.total_size - 1
+                    self.parts.append((start, end))
+                self.save_state()
+            
             threads_list = []
+            self.writer = WriteBehindWriter(self.write_buffer, self.fsync_policy)
             
-            for i in range(self.threads):
-                start = i * part_size
-                end = (i + 1) * part_size - 1 if i != self.threads - 1 else self.total_size - 1
-                thread = threading.Thread(target=self.download_part, args=(i, start, end))
+            for i, (start, end) in enumerate(self.parts):
+                thread = threading.Thread(target=self.download_part, args=(i, start, end), daemon=True)
                 threads_list.append(thread)
                 thread.start()
             
-            for thread in threads_list:
-                thread.join()
+            self.join_workers(threads_list)
+            self.finish_writes()
             
             if self.is_running:
                 try:
                     self.log_signal.emit("正在合并临时文件...", "info")
                     with open(self.save_path, 'wb') as final_file:
-                        for i in range(self.threads):
+                        for i in range(len(self.parts)):
                             temp_file = f"{self.save_path}.part{i}"
                             if os.path.exists(temp_file):
                                 with open(temp_file, 'rb') as f:
                                     final_file.write(f.read())
                                 os.remove(temp_file)
+                    self.remove_state()
                     
                     elapsed_time = time.time() - self.start_time
                     self.log_signal.emit(f"下载完成! 用时: {elapsed_time:.1f}秒", "success")
@@ -81,40 +622,763 @@ class DownloadThread(QThread):
                     self.log_signal.emit(f"合并文件错误: {str(e)}", "error")
                     self.finished_signal.emit(False, f"合并文件错误: {str(e)}")
             else:
-                self.log_signal.emit("下载已取消", "warning")
-                self.finished_signal.emit(False, "下载已取消")
-                for i in range(self.threads):
+                self.report_stopped()
+                if self.paused:
+                    return
+                for i in range(len(self.parts)):
                     temp_file = f"{self.save_path}.part{i}"
                     if os.path.exists(temp_file):
                         os.remove(temp_file)
+                self.remove_state()
                 
         except Exception as e:
+            if not self.is_running:
+                self.report_stopped()
+                return
             self.log_signal.emit(f"下载错误: {str(e)}", "error")
             self.finished_signal.emit(False, f"下载错误: {str(e)}")
+        finally:
+            for client in self.http2_clients:
+                client.close()
+            self.http2_clients = []
     
-    def download_part(self, thread_id, start, end):
-        """下载文件的一部分"""
-        headers = {'Range': f'bytes={start}-{end}'}
+    def report_stopped(self):
+        """报告下载已暂停或已取消"""
+        if self.paused:
+            self.log_signal.emit("下载已暂停, 再次开始即可继续", "warning")
+            self.finished_signal.emit(False, "下载已暂停")
+        else:
+            self.log_signal.emit("下载已取消", "warning")
+            self.finished_signal.emit(False, "下载已取消")
+    
+    def load_state(self):
+        """读取上次暂停时保存的分段信息, 与当前文件不符时忽略"""
         try:
-            response = requests.get(self.url, headers=headers, stream=True, timeout=30)
+            with open(f"{self.save_path}.state.json", 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state['url'] == self.url and state['total_size'] == self.total_size:
+                return [tuple(part) for part in state['parts']]
+        except Exception:
+            pass
+        return []
+    
+    def save_state(self):
+        """保存分段信息, 用于暂停后继续"""
+        with open(f"{self.save_path}.state.json", 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'total_size': self.total_size, 'parts': self.parts}, f)
+    
+    def remove_state(self):
+        """删除分段信息文件"""
+        if os.path.exists(f"{self.save_path}.state.json"):
+            os.remove(f"{self.save_path}.state.json")
+    
+    def join_workers(self, threads_list):
+        """等待工作线程结束, 停止后超过期限的线程直接放弃"""
+        for thread in threads_list:
+            while thread.is_alive():
+                thread.join(0.1)
+                if not self.is_running and time.time() - self.stop_time > self.STOP_TIMEOUT:
+                    return
+    
+    def prefer_compressed(self, content_type):
+        """文本类文件较小或只用单线程时, 用压缩单连接代替不压缩的多线程分段"""
+        if not any(t in content_type.lower() for t in self.COMPRESSIBLE_TYPES):
+            return False
+        return self.threads == 1 or self.total_size <= self.COMPRESS_MAX_SIZE
+    
+    def download_compressed(self):
+        """协商gzip压缩传输, 边接收边解压写盘; 暂停后改用范围请求继续"""
+        temp_file = f"{self.save_path}.part0"
+        try:
+            self.receive_compressed(temp_file)
+        except Exception:
+            # 数据不完整时不能留下分段, 否则下次会被当作文件开头继续下载
+            if self.is_running and os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        finally:
+            if not self.is_running and self.paused:
+                # 已解压的内容就是文件开头, 保存为单个分段
+                self.parts = [(0, self.total_size - 1)]
+                self.save_state()
+            elif not self.is_running and os.path.exists(temp_file):
+                os.remove(temp_file)
+        
+        if not self.is_running:
+            self.report_stopped()
+            return
+        os.replace(temp_file, self.save_path)
+        elapsed_time = time.time() - self.start_time
+        self.log_signal.emit(
+            f"传输 {self.format_size(self.wire_size)}, 写入 {self.format_size(self.downloaded_size)}", "info")
+        self.log_signal.emit(f"下载完成! 用时: {elapsed_time:.1f}秒", "success")
+        self.finished_signal.emit(True, "下载完成")
+    
+    def receive_compressed(self, temp_file):
+        """接收压缩数据并解压写入临时文件
+        
+        只协商gzip: zlib可以限制每次解压的输出, br解压没有输出上限, 高压缩比的数据会一次性占满内存
+        """
+        with self.request_resolved({'Accept-Encoding': 'gzip'}) as response:
             response.raise_for_status()
-            
-            temp_file = f"{self.save_path}.part{thread_id}"
+            response.raw.decode_content = False
+            encoding = response.headers.get('Content-Encoding', 'identity').lower()
+            if encoding == 'gzip':
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            elif encoding == 'identity':
+                decompressor = None
+            else:
+                raise ValueError(f"不支持的内容编码: {encoding}")
+            self.compressed = decompressor is not None
+            if self.compressed:
+                self.log_signal.emit(f"压缩传输: {encoding}", "info")
+            else:
+                self.log_signal.emit("服务器未压缩, 按原样单连接传输", "warning")
             
             with open(temp_file, 'wb') as f:
+                while self.is_running:
+                    chunk = response.raw.read(65536)
+                    if not chunk:
+                        break
+                    self.wire_size += len(chunk)
+                    if decompressor is None:
+                        self.write_decoded(f, chunk)
+                    else:
+                        # 限制单次解压输出, 避免高压缩比数据占用大量内存
+                        data = decompressor.decompress(chunk, 1 << 20)
+                        self.write_decoded(f, data)
+                        while decompressor.unconsumed_tail:
+                            data = decompressor.decompress(decompressor.unconsumed_tail, 1 << 20)
+                            self.write_decoded(f, data)
+                if not self.is_running:
+                    return
+                if decompressor is not None:
+                    self.write_decoded(f, decompressor.flush())
+                    if not decompressor.eof:
+                        raise ValueError("压缩数据不完整, 连接可能提前断开")
+                if self.downloaded_size != self.total_size:
+                    raise ValueError(
+                        f"解压后的数据不完整: {self.format_size(self.downloaded_size)}/"
+                        f"{self.format_size(self.total_size)}")
+    
+    def write_decoded(self, f, data):
+        """写入解压后的数据并更新进度, 超过HEAD报告的文件大小时中止"""
+        if not data:
+            return
+        if self.downloaded_size + len(data) > self.total_size:
+            raise ValueError("解压后的数据超过文件大小")
+        f.write(data)
+        self.downloaded_size += len(data)
+        progress = min(int((self.downloaded_size / self.total_size) * 100), 100) if self.total_size > 0 else 0
+        self.progress_signal.emit(progress, self.downloaded_size, self.total_size)
+    
+    def resolve_url(self, stale_url=None):
+        """获取缓存的最终下载地址, 过期或失效时重新解析"""
+        with DownloadThread.redirect_lock:
+            cached = DownloadThread.redirect_cache.get(self.url)
+            if cached and cached[1] > time.time() and cached[0] != stale_url:
+                return cached[0]
+        response = requests.head(self.url, allow_redirects=True, timeout=10)
+        response.close()
+        return self.cache_resolved(response.url)
+    
+    def cache_resolved(self, final_url):
+        """缓存重定向后的地址, 直到签名过期"""
+        with DownloadThread.redirect_lock:
+            DownloadThread.redirect_cache[self.url] = (final_url, self.url_expiry(final_url))
+        return final_url
+    
+    def url_expiry(self, url):
+        """从签名参数中推算地址的过期时间, 预留30秒余量"""
+        query = {k: v[0] for k, v in parse_qs(urlparse(url).query).items()}
+        expiry = time.time() + self.REDIRECT_TTL
+        try:
+            if 'X-Amz-Date' in query and 'X-Amz-Expires' in query:
+                signed = datetime.strptime(query['X-Amz-Date'], '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+                expiry = signed.timestamp() + int(query['X-Amz-Expires'])
+            elif 'se' in query:
+                expiry = datetime.strptime(query['se'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+            elif 'Expires' in query:
+                expiry = int(query['Expires'])
+        except ValueError:
+            pass
+        return expiry - 30
+    
+    def request_resolved(self, headers=None, stream=True, http2=False):
+        """直接请求最终地址, 签名过期时重新解析后重试"""
+        def get(url):
+            if http2 and self.http2_clients:
+                return Http2Response(next(self.next_http2_client), url, headers)
+            return requests.get(url, headers=headers, stream=stream, timeout=30)
+        
+        url = self.resolve_url()
+        response = get(url)
+        if url != self.url and response.status_code in (400, 401, 403, 404, 410):
+            response.close()
+            self.log_signal.emit("下载地址已失效, 重新解析", "warning")
+            url = self.resolve_url(stale_url=url)
+            response = get(url)
+        with self.response_lock:
+            self.active_responses.add(response)
+        if not self.is_running:
+            self.abort_response(response)
+        return response
+    
+    def abort_response(self, response):
+        """关闭响应的底层连接, 让阻塞在读取上的线程立即返回"""
+        try:
+            if isinstance(response, Http2Response):
+                response.close()
+                return
+            connection = getattr(response.raw, '_connection', None)
+            sock = getattr(connection, 'sock', None)
+            if sock is None:
+                sock = getattr(getattr(getattr(response.raw, '_fp', None), 'fp', None), 'raw', None)
+                sock = getattr(sock, '_sock', None)
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            response.close()
+        except Exception:
+            pass
+    
+    def head_probe(self):
+        """探测文件信息, 启用HTTP/2时顺便确认代理是否支持"""
+        headers = {'Accept-Encoding': 'identity'}
+        if self.use_http2 and httpx is None:
+            self.log_signal.emit("未安装 httpx[http2], 使用HTTP/1.1", "warning")
+        elif self.use_http2:
+            client = None
+            try:
+                # 安装了httpx但没有h2时, 创建客户端会抛出ImportError
+                client = httpx.Client(http2=True, follow_redirects=True, timeout=30)
+                response = client.head(self.url, headers=headers)
+                if response.http_version == 'HTTP/2':
+                    # 同一客户端的请求总是复用一个HTTP/2连接, 多个连接需要多个客户端, 分段轮流使用
+                    self.http2_clients = [client] + [
+                        httpx.Client(http2=True, follow_redirects=True, timeout=30)
+                        for _ in range(self.http2_connections - 1)]
+                    self.next_http2_client = cycle(self.http2_clients)
+                    self.log_signal.emit(f"使用HTTP/2多路复用, 连接数: {self.http2_connections}", "info")
+                    return response
+                self.log_signal.emit("代理不支持HTTP/2, 使用HTTP/1.1", "warning")
+            except Exception as e:
+                self.log_signal.emit(f"HTTP/2连接失败, 使用HTTP/1.1: {str(e)}", "warning")
+            if client is not None:
+                client.close()
+        return requests.head(self.url, allow_redirects=True, timeout=10, headers=headers)
+    
+    def download_part(self, thread_id, start, end):
+        """下载文件的一部分"""
+        if not self.is_running:
+            return
+        temp_file = f"{self.save_path}.part{thread_id}"
+        # 暂停后继续时从已下载的位置接着请求
+        offset = 0
+        if os.path.exists(temp_file):
+            if self.resume_parts:
+                offset = min(os.path.getsize(temp_file), end - start + 1)
+                self.downloaded_size += offset
+            else:
+                os.remove(temp_file)
+        if start + offset > end:
+            return
+        
+        headers = {'Range': f'bytes={start + offset}-{end}', 'Accept-Encoding': 'identity'}
+        try:
+            with self.request_resolved(headers, http2=True) as response:
+                response.raise_for_status()
+                
+                network_wait = 0.0
+                waiting_since = time.time()
+                # 数据交给写盘线程, 接收线程只负责读网络
                 for chunk in response.iter_content(chunk_size=8192):
                     if chunk and self.is_running:
-                        f.write(chunk)
+                        network_wait += time.time() - waiting_since
+                        self.writer.write(temp_file, offset, chunk)
+                        offset += len(chunk)
                         self.downloaded_size += len(chunk)
                         progress = int((self.downloaded_size / self.total_size) * 100) if self.total_size > 0 else 0
                         self.progress_signal.emit(progress, self.downloaded_size, self.total_size)
+                        waiting_since = time.time()
                     else:
                         break
+                with self.writer.cond:
+                    self.network_wait += network_wait
             
         except Exception as e:
+            if not self.is_running:
+                return
             self.log_signal.emit(f"线程{thread_id+1}下载错误: {str(e)}", "error")
             self.is_running = False
     
+    def finish_writes(self):
+        """等待后台写盘完成并输出耗时统计"""
+        self.writer.close()
+        if self.writer.error:
+            raise self.writer.error
+        self.log_signal.emit(
+            f"网络等待 {self.network_wait:.1f}秒, 磁盘阻塞 {self.writer.disk_wait:.1f}秒, "
+            f"写盘 {self.writer.write_time:.1f}秒", "info")
+    
+    def run_delta(self):
+        """根据块清单只下载变化的部分, 未找到清单时返回False"""
+        try:
+            response = requests.get(self.url + '.blocks.json', timeout=10)
+            if response.status_code != 200:
+                self.log_signal.emit("未找到块清单, 使用完整下载", "warning")
+                return False
+            manifest = BlockManifest.from_json(response.json())
+        except Exception as e:
+            self.log_signal.emit(f"读取块清单失败, 使用完整下载: {str(e)}", "warning")
+            return False
+        
+        ranges = []
+        full_download = False
+        try:
+            self.start_time = time.time()
+            found = manifest.match(self.base_file, lambda: self.is_running)
+            reused = sum(end - start + 1 for start, end in map(manifest.block_range, found))
+            if manifest.length and reused < manifest.length * self.DELTA_MIN_REUSE:
+                self.log_signal.emit(
+                    f"旧文件中只有 {self.format_size(reused)} 可复用, 使用完整下载", "warning")
+                full_download = True
+                return False
+            ranges = self.missing_ranges(manifest, found)
+            self.total_size = sum(end - start + 1 for _, _, start, end in ranges)
+            self.log_signal.emit(
+                f"复用旧文件中 {len(found)}/{len(manifest.blocks)} 个块, "
+                f"需下载 {self.format_size(self.total_size)}", "info")
+            self.parts = [(start, end) for _, _, start, end in ranges]
+            if self.load_state() == self.parts:
+                self.resume_parts = True
+                self.log_signal.emit("发现未完成的下载, 继续上次的进度", "info")
+            else:
+                self.save_state()
+            
+            self.writer = WriteBehindWriter(self.write_buffer, self.fsync_policy)
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                for i, (_, _, start, end) in enumerate(ranges):
+                    executor.submit(self.download_part, i, start, end)
+            self.finish_writes()
+            
+            if not self.is_running:
+                self.report_stopped()
+                return True
+            
+            self.log_signal.emit("正在合并新旧数据块...", "info")
+            self.assemble_delta(manifest, found, ranges)
+            elapsed_time = time.time() - self.start_time
+            self.log_signal.emit(f"增量更新完成! 用时: {elapsed_time:.1f}秒", "success")
+            self.finished_signal.emit(True, "下载完成")
+        except Exception as e:
+            if not self.is_running:
+                self.report_stopped()
+                return True
+            self.log_signal.emit(f"增量更新错误: {str(e)}", "error")
+            self.finished_signal.emit(False, f"增量更新错误: {str(e)}")
+        finally:
+            # 暂停时保留已下载的分段, 继续时按相同的范围接着下载
+            if not self.paused and not full_download:
+                for i in range(len(ranges)):
+                    temp_file = f"{self.save_path}.part{i}"
+                    if os.path.exists(temp_file):
+                        os.remove(temp_file)
+                self.remove_state()
+        return True
+    
+    def missing_ranges(self, manifest, found):
+        """把缺失的块合并成连续的下载范围, 每个范围最多占缺失块的1/threads, 大段变化也能多线程下载"""
+        missing = [index for index in range(len(manifest.blocks)) if index not in found]
+        limit = max(1, -(-len(missing) // self.threads))
+        ranges = []
+        for index in missing:
+            start, end = manifest.block_range(index)
+            if ranges and ranges[-1][1] == index - 1 and index - ranges[-1][0] < limit:
+                ranges[-1] = (ranges[-1][0], index, ranges[-1][2], end)
+            else:
+                ranges.append((index, index, start, end))
+        return ranges
+    
+    def assemble_delta(self, manifest, found, ranges):
+        """用旧文件的块和下载的块拼出新文件"""
+        temp_path = f"{self.save_path}.delta"
+        range_by_block = {first: i for i, (first, _, _, _) in enumerate(ranges)}
+        digest = hashlib.sha256()
+        with open(self.base_file, 'rb') as old_file, open(temp_path, 'wb') as new_file:
+            old_data = mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) if found else None
+            try:
+                index = 0
+                while index < len(manifest.blocks):
+                    if index in found:
+                        start, end = manifest.block_range(index)
+                        block = old_data[found[index]:found[index] + end - start + 1]
+                        new_file.write(block)
+                        digest.update(block)
+                        index += 1
+                        continue
+                    part = range_by_block[index]
+                    first, last, _, _ = ranges[part]
+                    with open(f"{self.save_path}.part{part}", 'rb') as f:
+                        for block_index in range(first, last + 1):
+                            start, end = manifest.block_range(block_index)
+                            block = f.read(end - start + 1)
+                            if hashlib.md5(block).hexdigest() != manifest.blocks[block_index][1]:
+                                raise ValueError(f"数据块{block_index}校验失败")
+                            new_file.write(block)
+                            digest.update(block)
+                    index = last + 1
+            finally:
+                if old_data is not None:
+                    old_data.close()
+        if manifest.sha256 and digest.hexdigest() != manifest.sha256:
+            os.remove(temp_path)
+            raise ValueError("文件SHA-256校验失败")
+        os.replace(temp_path, self.save_path)
+    
+    def run_extract(self):
+        """边下载边解压codeload压缩包"""
+        try:
+            self.start_time = time.time()
+            os.makedirs(self.extract_dir, exist_ok=True)
+            archive_format = self.archive_format()
+            self.log_signal.emit(f"边下边解压到: {self.extract_dir}", "info")
+            if archive_format == 'tar.gz':
+                self.extract_tar_stream()
+            elif archive_format == 'zip':
+                self.extract_zip_stream()
+            else:
+                raise ValueError("无法识别压缩包格式")
+            
+            elapsed_time = time.time() - self.start_time
+            self.log_signal.emit(f"下载并解压完成! 用时: {elapsed_time:.1f}秒", "success")
+            self.finished_signal.emit(True, "下载完成")
+        except DownloadCancelled:
+            self.report_stopped()
+        except Exception as e:
+            if not self.is_running:
+                self.report_stopped()
+                return
+            self.log_signal.emit(f"解压错误: {str(e)}", "error")
+            self.finished_signal.emit(False, f"解压错误: {str(e)}")
+    
+    def run_select(self):
+        """通过范围请求只下载zip中选中的文件"""
+        error = None
+        try:
+            self.start_time = time.time()
+            entries = self.read_zip_directory()
+            if entries is None:
+                raise ValueError("服务器不支持范围请求, 无法选择性下载")
+            self.log_signal.emit(f"zip中共有{len(entries)}个条目", "info")
+            
+            selected = [e for e in entries if not e['name'].endswith('/')
+                        and any(fnmatch.fnmatch(e['name'], p) for p in self.members)]
+            if not selected:
+                for entry in entries[:50]:
+                    self.log_signal.emit(f"  {entry['name']} ({self.format_size(entry['size'])})", "info")
+                raise ValueError("没有匹配的条目")
+            
+            self.total_size = sum(e['compressed_size'] for e in selected)
+            self.log_signal.emit(
+                f"选中{len(selected)}个条目, 需下载 {self.format_size(self.total_size)}", "info")
+            os.makedirs(self.extract_dir, exist_ok=True)
+            with ThreadPoolExecutor(max_workers=self.threads) as executor:
+                futures = [executor.submit(self.fetch_member, e) for e in selected]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception as e:
+                    # 一个条目出错后立即停止其余条目, 退出时不必等它们下载完; 报告的仍是这个错误
+                    if self.is_running:
+                        error = e
+                        self.stop()
+                    raise
+            
+            elapsed_time = time.time() - self.start_time
+            self.log_signal.emit(f"选择性下载完成! 用时: {elapsed_time:.1f}秒", "success")
+            self.finished_signal.emit(True, "下载完成")
+        except DownloadCancelled:
+            self.report_stopped()
+        except Exception as e:
+            if not self.is_running and e is not error:
+                self.report_stopped()
+                return
+            self.is_running = False
+            self.log_signal.emit(f"选择性下载错误: {str(e)}", "error")
+            self.finished_signal.emit(False, f"选择性下载错误: {str(e)}")
+    
+    def fetch_member(self, entry):
+        """下载并解压单个zip条目的字节范围"""
+        if not self.is_running:
+            raise DownloadCancelled()
+        # 本地文件头中的扩展字段长度可能与中央目录不同, 按最大长度请求, 读够即关闭连接
+        end = entry['offset'] + 30 + 0xFFFF * 2 + entry['compressed_size'] - 1
+        with self.open_stream({'Range': f"bytes={entry['offset']}-{end}"}) as response:
+            if response.status_code != 206:
+                raise ValueError("服务器不支持范围请求")
+            header_reader = StreamReader(response.raw, lambda size: None)
+            header = header_reader.read_exact(30)
+            signature, _, _, _, _, _, _, _, _, name_len, extra_len = struct.unpack('<4s5H3L2H', header)
+            if signature != b'PK\x03\x04':
+                raise ValueError(f"本地文件头损坏: {entry['name']}")
+            header_reader.skip(name_len + extra_len)
+            reader = StreamReader(response.raw, self.stream_progress)
+            target = self.safe_path(entry['name'])
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            self.extract_zip_entry(reader, entry, target)
+        self.log_signal.emit(f"已解压: {entry['name']}", "info")
+    
+    def archive_format(self):
+        """根据codeload链接判断压缩包格式"""
+        path = self.url.split('?')[0]
+        if '/tar.gz/' in path or '/legacy.tar.gz/' in path or path.endswith('.tar.gz'):
+            return 'tar.gz'
+        if '/zip/' in path or '/legacy.zip/' in path or path.endswith('.zip'):
+            return 'zip'
+        return None
+    
+    def open_stream(self, headers=None):
+        """打开原始网络流, 不做内容解码"""
+        response = self.request_resolved(headers)
+        response.raise_for_status()
+        response.raw.decode_content = False
+        if 'Content-Length' in response.headers and not headers:
+            self.total_size = int(response.headers['Content-Length'])
+        return response
+    
+    def stream_progress(self, size):
+        """流式读取的进度回调"""
+        if not self.is_running:
+            raise DownloadCancelled()
+        self.downloaded_size += size
+        progress = int((self.downloaded_size / self.total_size) * 100) if self.total_size > 0 else 0
+        self.progress_signal.emit(progress, self.downloaded_size, self.total_size)
+    
+    def safe_path(self, name):
+        """生成解压目标路径, 拒绝越出解压目录的条目, 包括经由已解压的符号链接越出的"""
+        base = os.path.abspath(self.extract_dir)
+        target = os.path.abspath(os.path.join(base, name))
+        real_base = os.path.realpath(base)
+        if (os.path.isabs(name) or os.path.commonpath([base, target]) != base
+                or os.path.commonpath([real_base, os.path.realpath(target)]) != real_base):
+            raise ValueError(f"非法的压缩包条目: {name}")
+        return target
+    
+    def extract_tar_stream(self):
+        """从网络流直接解压tar.gz, 不落盘"""
+        with self.open_stream() as response:
+            reader = StreamReader(response.raw, self.stream_progress)
+            with tarfile.open(fileobj=reader, mode='r|gz') as tar:
+                for member in tar:
+                    if member.issym() or member.islnk():
+                        self.extract_tar_link(member)
+                        continue
+                    if not (member.isfile() or member.isdir()):
+                        self.log_signal.emit(f"跳过特殊文件: {member.name}", "warning")
+                        continue
+                    target = self.safe_path(member.name)
+                    if member.isdir():
+                        os.makedirs(target, exist_ok=True)
+                        continue
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    source = tar.extractfile(member)
+                    with open(target, 'wb') as f:
+                        while True:
+                            chunk = source.read(65536)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                    os.chmod(target, member.mode & 0o755 | 0o600)
+    
+    def extract_tar_link(self, member):
+        """解压tar中的链接: 符号链接只能指向解压目录内, 硬链接复制之前解压的文件"""
+        target = self.safe_path(member.name)
+        if member.issym():
+            source = os.path.join(os.path.dirname(member.name), member.linkname)
+        else:
+            source = member.linkname
+        try:
+            source_path = self.safe_path(source)
+        except ValueError:
+            self.log_signal.emit(f"跳过指向解压目录外的链接: {member.name} -> {member.linkname}", "warning")
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.islink(target) or os.path.isfile(target):
+            os.remove(target)
+        if member.islnk():
+            if os.path.isfile(source_path):
+                shutil.copyfile(source_path, target)
+            else:
+                self.log_signal.emit(f"跳过硬链接, 目标不存在: {member.name} -> {member.linkname}", "warning")
+            return
+        # 按解析后的真实路径重写链接, 之后解压的符号链接不会改变它指向的位置
+        real_source = os.path.realpath(source_path)
+        link = os.path.relpath(real_source, os.path.realpath(os.path.dirname(target)))
+        try:
+            os.symlink(link, target, target_is_directory=os.path.isdir(real_source))
+        except OSError as e:
+            self.log_signal.emit(f"无法创建符号链接 {member.name}: {str(e)}", "warning")
+    
+    def extract_zip_stream(self):
+        """先读取zip中央目录, 再顺序下载并逐个解压条目"""
+        entries = self.read_zip_directory()
+        if entries is None:
+            self.log_signal.emit("服务器不支持范围请求, 下载完成后再解压", "warning")
+            self.extract_zip_spooled()
+            return
+        
+        self.log_signal.emit(f"读取到{len(entries)}个条目, 开始边下边解压", "info")
+        with self.open_stream() as response:
+            reader = StreamReader(response.raw, self.stream_progress)
+            position = 0
+            for entry in sorted(entries, key=lambda e: e['offset']):
+                reader.skip(entry['offset'] - position)
+                header = reader.read_exact(30)
+                signature, _, _, _, _, _, _, _, _, name_len, extra_len = struct.unpack('<4s5H3L2H', header)
+                if signature != b'PK\x03\x04':
+                    raise ValueError(f"本地文件头损坏: {entry['name']}")
+                reader.skip(name_len + extra_len)
+                position = entry['offset'] + 30 + name_len + extra_len + entry['compressed_size']
+                
+                target = self.safe_path(entry['name'])
+                if entry['name'].endswith('/'):
+                    os.makedirs(target, exist_ok=True)
+                    reader.skip(entry['compressed_size'])
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                self.extract_zip_entry(reader, entry, target)
+    
+    def extract_zip_entry(self, reader, entry, target):
+        """解压单个zip条目"""
+        if entry['method'] == 8:
+            decompressor = zlib.decompressobj(-15)
+        elif entry['method'] != 0:
+            raise ValueError(f"不支持的压缩方式: {entry['method']}")
+        crc = 0
+        remaining = entry['compressed_size']
+        with open(target, 'wb') as f:
+            while remaining > 0:
+                chunk = reader.read_exact(min(remaining, 65536))
+                remaining -= len(chunk)
+                if entry['method'] == 8:
+                    chunk = decompressor.decompress(chunk)
+                crc = zlib.crc32(chunk, crc)
+                f.write(chunk)
+            if entry['method'] == 8:
+                tail = decompressor.flush()
+                crc = zlib.crc32(tail, crc)
+                f.write(tail)
+        if crc != entry['crc']:
+            raise ValueError(f"CRC校验失败: {entry['name']}")
+    
+    def fetch_range(self, start, end=None):
+        """请求指定字节范围, 服务器不支持时返回None
+        
+        先检查状态码再读取响应体, 服务器忽略Range返回整个文件时直接关闭连接, 不下载内容
+        """
+        if start < 0:
+            range_header = f'bytes={start}'
+        else:
+            range_header = f'bytes={start}-{"" if end is None else end}'
+        with self.request_resolved({'Range': range_header, 'Accept-Encoding': 'identity'}) as response:
+            response.raise_for_status()
+            if response.status_code != 206:
+                return None, None
+            match = re.match(r'bytes (\d+)-(\d+)/(\d+|\*)', response.headers.get('Content-Range', ''))
+            if not match:
+                raise ValueError("无法解析Content-Range")
+            first, last = int(match.group(1)), int(match.group(2))
+            total = int(match.group(3)) if match.group(3) != '*' else 0
+            data = StreamReader(response.raw, lambda size: None).read_exact(last - first + 1)
+        return data, (first, total)
+    
+    def read_zip_directory(self):
+        """通过范围请求读取zip中央目录"""
+        tail, info = self.fetch_range(-65557)
+        if tail is None:
+            return None
+        tail_offset, self.total_size = info
+        eocd = tail.rfind(b'PK\x05\x06')
+        if eocd < 0:
+            raise ValueError("找不到zip目录结尾")
+        _, _, _, _, count, cd_size, cd_offset, _ = struct.unpack('<4s4H2LH', tail[eocd:eocd + 22])
+        
+        if cd_offset == 0xFFFFFFFF or count == 0xFFFF:
+            # zip64格式, 从定位记录中取目录信息
+            locator = tail[eocd - 20:eocd]
+            _, _, record_offset, _ = struct.unpack('<4sLQL', locator)
+            record = self.read_bytes(tail, tail_offset, record_offset, 56)
+            _, _, _, _, _, _, _, count, cd_size, cd_offset = struct.unpack('<4sQ2H2L4Q', record)
+        
+        directory = self.read_bytes(tail, tail_offset, cd_offset, cd_size)
+        entries = []
+        pos = 0
+        for _ in range(count):
+            fields = struct.unpack('<4s6H3L5H2L', directory[pos:pos + 46])
+            flags, method, crc = fields[3], fields[4], fields[7]
+            compressed_size, name_len, extra_len, comment_len = fields[8], fields[10], fields[11], fields[12]
+            file_size, offset = fields[9], fields[16]
+            raw_name = directory[pos + 46:pos + 46 + name_len]
+            name = raw_name.decode('utf-8' if flags & 0x800 else 'cp437')
+            extra = directory[pos + 46 + name_len:pos + 46 + name_len + extra_len]
+            if 0xFFFFFFFF in (file_size, compressed_size, offset):
+                file_size, compressed_size, offset = self.parse_zip64_extra(extra, file_size, compressed_size, offset)
+            entries.append({
+                'name': name,
+                'method': method,
+                'crc': crc,
+                'size': file_size,
+                'compressed_size': compressed_size,
+                'offset': offset,
+            })
+            pos += 46 + name_len + extra_len + comment_len
+        return entries
+    
+    def parse_zip64_extra(self, extra, file_size, compressed_size, offset):
+        """解析zip64扩展字段中的大小和偏移"""
+        pos = 0
+        while pos + 4 <= len(extra):
+            tag, size = struct.unpack('<2H', extra[pos:pos + 4])
+            if tag == 0x0001:
+                values = extra[pos + 4:pos + 4 + size]
+                index = 0
+                if file_size == 0xFFFFFFFF:
+                    file_size = struct.unpack('<Q', values[index:index + 8])[0]
+                    index += 8
+                if compressed_size == 0xFFFFFFFF:
+                    compressed_size = struct.unpack('<Q', values[index:index + 8])[0]
+                    index += 8
+                if offset == 0xFFFFFFFF:
+                    offset = struct.unpack('<Q', values[index:index + 8])[0]
+                break
+            pos += 4 + size
+        return file_size, compressed_size, offset
+    
+    def read_bytes(self, tail, tail_offset, start, size):
+        """优先从已下载的尾部数据中取字节, 否则发起范围请求"""
+        if start >= tail_offset:
+            return tail[start - tail_offset:start - tail_offset + size]
+        data, _ = self.fetch_range(start, start + size - 1)
+        if data is None:
+            raise ValueError("服务器不支持范围请求")
+        return data
+    
+    def extract_zip_spooled(self):
+        """不支持范围请求时, 先保存到磁盘再解压"""
+        with self.open_stream() as response:
+            reader = StreamReader(response.raw, self.stream_progress)
+            with open(self.save_path, 'wb') as f:
+                while True:
+                    chunk = reader.read(65536)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+        try:
+            with zipfile.ZipFile(self.save_path) as archive:
+                archive.extractall(self.extract_dir)
+        finally:
+            os.remove(self.save_path)
+    
     def format_size(self, size):
         """格式化文件大小"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -123,9 +1387,500 @@ class DownloadThread(QThread):
             size /= 1024.0
         return f"{size:.2f} TB"
     
-    def stop(self):
-        """停止下载"""
+    def stop(self, keep_parts=False):
+        """停止下载, 关闭所有连接; keep_parts为True时保留进度以便继续"""
+        self.paused = keep_parts
+        self.stop_time = time.time()
         self.is_running = False
+        with self.response_lock:
+            responses = list(self.active_responses)
+        for response in responses:
+            self.abort_response(response)
+        for client in list(self.http2_clients):
+            client.close()
+    
+    def can_pause(self):
+        """边下边解压和选择性下载直接写出文件, 没有可继续的分段"""
+        return not (self.extract_dir or self.members)
+    
+    def pause(self):
+        """暂停下载, 保留已下载的分段; 不支持暂停的模式直接停止"""
+        self.stop(keep_parts=self.can_pause())
+    
+    def cancel_paused(self):
+        """丢弃已暂停下载保留的分段"""
+        for i in range(len(self.parts)):
+            temp_file = f"{self.save_path}.part{i}"
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+        self.remove_state()
+
+class DownloadDaemon:
+    """本地下载服务, 通过HTTP JSON接口接收任务, 相同链接同时只下载一次
+    
+    所有文件只能写入启动时指定的下载根目录; 请求必须带上令牌文件中的令牌,
+    令牌文件只有服务的所有者可读, 因此同一台机器上的其他用户无法提交任务。
+    """
+    DEFAULT_PORT = 8765
+    DEFAULT_PROXY = "https://ghfast.top/"
+    TOKEN_DIR = "~/.github-downloader"
+    
+    def __init__(self, port=DEFAULT_PORT, root=None):
+        self.port = port
+        self.root = os.path.realpath(os.path.expanduser(root or "~/Downloads"))
+        if not os.path.isdir(self.root):
+            raise ValueError(f"下载根目录不存在: {self.root}")
+        self.token = secrets.token_urlsafe(32)
+        self.jobs = {}
+        self.lock = threading.RLock()
+        self.next_id = 1
+        self.post_processor = PostProcessor()
+    
+    @classmethod
+    def token_file(cls, port):
+        """端口对应的令牌文件路径"""
+        return os.path.join(os.path.expanduser(cls.TOKEN_DIR), f"daemon-{port}.token")
+    
+    @classmethod
+    def read_token(cls, port):
+        """读取令牌, 供客户端使用"""
+        with open(cls.token_file(port), 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    
+    def write_token(self):
+        """把令牌写入只有所有者可读写的文件"""
+        path = self.token_file(self.port)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        os.chmod(os.path.dirname(path), 0o700)
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(path, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(self.token)
+        return path
+    
+    def create_server(self):
+        """创建只监听本机的HTTP服务并写出令牌文件; port为0时使用系统分配的端口"""
+        server = ThreadingHTTPServer(('127.0.0.1', self.port), DaemonRequestHandler)
+        server.daemon_threads = True
+        server.download_daemon = self
+        self.port = server.server_address[1]
+        self.write_token()
+        return server
+    
+    def serve_forever(self):
+        """启动HTTP服务"""
+        server = self.create_server()
+        print(f"GitHub Downloader 下载服务已启动: http://127.0.0.1:{self.port}")
+        print(f"下载根目录: {self.root}, 令牌文件: {self.token_file(self.port)}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            with self.lock:
+                jobs = list(self.jobs.values())
+            for job in jobs:
+                if job['status'] == 'running':
+                    job['thread'].pause()
+                    job['thread'].wait((DownloadThread.STOP_TIMEOUT + 1) * 1000)
+            server.server_close()
+            self.post_processor.shutdown()
+            if os.path.exists(self.token_file(self.port)):
+                os.remove(self.token_file(self.port))
+    
+    def submit(self, request):
+        """提交任务; 相同链接以相同选项正在下载时复用已有任务, 已暂停时继续下载
+        
+        request中的client标识提交的客户端, 共享同一任务的客户端全部取消后任务才会取消
+        """
+        original_url = request.get('url', '').strip()
+        proxy = request.get('proxy', self.DEFAULT_PROXY)
+        if proxy not in [prefix for _, prefix in PROXY_PREFIXES]:
+            raise ValueError("不支持的加速代理")
+        download_url = accelerate_url(original_url, proxy)
+        if download_url is None:
+            raise ValueError("不支持的链接格式")
+        save_folder = request.get('save_folder') or self.root
+        if not os.path.isabs(save_folder) or not os.path.isdir(save_folder):
+            raise ValueError("保存文件夹不存在")
+        save_folder = os.path.realpath(save_folder)
+        if save_folder != self.root and not self.inside(save_folder, self.root):
+            raise ValueError(f"保存文件夹必须位于下载根目录内: {self.root}")
+        file_name = request.get('file_name') or default_file_name(original_url)
+        if file_name.startswith('.') or '/' in file_name or '\\' in file_name or os.path.basename(file_name) != file_name:
+            raise ValueError("文件名不能包含路径, 也不能以.开头")
+        extract_dir = request.get('extract_dir')
+        if extract_dir:
+            if not self.inside(extract_dir, save_folder):
+                raise ValueError("解压目录必须位于保存文件夹内")
+            extract_dir = os.path.realpath(extract_dir)
+        members = request.get('members') or None
+        if members is not None and not (isinstance(members, list) and all(isinstance(m, str) for m in members)):
+            raise ValueError("members 必须是字符串列表")
+        if members and not extract_dir:
+            # 与界面相同, 选择性下载默认解压到以文件名命名的目录
+            extract_dir = os.path.join(save_folder, os.path.splitext(file_name)[0])
+        try:
+            threads = int(request.get('threads', 4))
+        except (TypeError, ValueError):
+            raise ValueError("线程数必须是整数")
+        if not 1 <= threads <= 16:
+            raise ValueError("线程数必须在1到16之间")
+        try:
+            http2_connections = int(request.get('http2_connections', 1))
+        except (TypeError, ValueError):
+            raise ValueError("HTTP/2连接数必须是整数")
+        if not 1 <= http2_connections <= 8:
+            raise ValueError("HTTP/2连接数必须在1到8之间")
+        base_file = request.get('base_file')
+        if base_file and not (self.inside(base_file, save_folder) and os.path.isfile(base_file)):
+            raise ValueError("旧版本文件必须位于保存文件夹内")
+        post_stages = request.get('post_stages')
+        stages = parse_post_stages(post_stages or [])
+        for name, arg in stages:
+            if name in ('extract', 'move') and arg and not (
+                    os.path.realpath(arg) == self.root or self.inside(arg, self.root)):
+                raise ValueError(f"后处理步骤 {name} 的目标必须位于下载根目录内: {self.root}")
+        save_path = os.path.join(save_folder, file_name)
+        # 输出位置和下载方式都相同才视为同一任务
+        key = (original_url, save_path, extract_dir, members, stages)
+        client = str(request.get('client') or secrets.token_hex(8))
+        
+        with self.lock:
+            for job in self.jobs.values():
+                if job['status'] not in ('running', 'processing', 'paused'):
+                    continue
+                if job['key'] == key:
+                    job['clients'].add(client)
+                    if job['status'] == 'paused':
+                        self.start_job(job)
+                    return job, True
+                if job['save_path'] == save_path or (extract_dir and job['options']['extract_dir'] == extract_dir):
+                    raise ValueError(f"任务 {job['id']} 正在使用相同的保存位置, 但链接或选项不同")
+            job = {
+                'id': self.next_id,
+                'url': original_url,
+                'key': key,
+                'save_path': save_path,
+                'options': {
+                    'url': download_url,
+                    'threads': threads,
+                    'extract_dir': extract_dir,
+                    'members': members,
+                    'base_file': base_file,
+                    'use_http2': bool(request.get('use_http2')),
+                    'http2_connections': http2_connections,
+                },
+                'post_stages': post_stages,
+                'logs': [],
+                'clients': {client},
+            }
+            self.next_id += 1
+            self.jobs[job['id']] = job
+            self.start_job(job)
+            return job, False
+    
+    @staticmethod
+    def inside(path, folder):
+        """路径是否为绝对路径且位于folder内(解析符号链接后)"""
+        if not os.path.isabs(path):
+            return False
+        path = os.path.realpath(path)
+        return path != folder and os.path.commonpath([path, folder]) == folder
+    
+    def start_job(self, job):
+        """为任务创建下载线程并启动"""
+        options = job['options']
+        thread = DownloadThread(options['url'], job['save_path'], options['threads'], options['extract_dir'],
+                                options['members'], options['base_file'], options['use_http2'],
+                                options['http2_connections'])
+        # 信号在下载线程中直接处理, 服务进程不需要Qt事件循环
+        thread.log_signal.connect(lambda message, level: job['logs'].append([level, message]), Qt.DirectConnection)
+        thread.finished_signal.connect(lambda success, message: self.job_finished(job, success, message),
+                                       Qt.DirectConnection)
+        job.update(thread=thread, status='running', message='下载中')
+        thread.start()
+    
+    def job_finished(self, job, success, message):
+        """根据下载结果更新任务状态"""
+        with self.lock:
+            if success and os.path.isfile(job['save_path']):
+                job['status'] = 'processing'
+                job['message'] = message
+                future = self.post_processor.submit(
+                    job['save_path'], job['post_stages'],
+                    lambda ok, messages: self.post_finished(job, ok, messages))
+                if future is not None:
+                    job['logs'].append(['info', "开始后处理"])
+                    return
+            if success:
+                job['status'] = 'done'
+            elif job['thread'].paused:
+                # 暂停后各客户端都已结束等待, 继续下载时重新提交的客户端再加入
+                job['status'] = 'paused'
+                job['clients'].clear()
+            elif message == "下载已取消":
+                job['status'] = 'cancelled'
+            else:
+                job['status'] = 'failed'
+            job['message'] = message
+    
+    def post_finished(self, job, success, messages):
+        """后处理结束, 记录结果"""
+        with self.lock:
+            job['logs'].extend([['info' if success else 'error', m] for m in messages])
+            job['status'] = 'done' if success else 'failed'
+            if not success:
+                job['message'] = f"后处理失败: {messages[0]}"
+    
+    def control(self, job_id, action, client=None):
+        """暂停、取消、继续任务, 或断开客户端与任务的连接
+        
+        带client的取消只断开该客户端, 没有其他客户端共享任务时才真正取消
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                raise KeyError(job_id)
+            if action == 'detach':
+                job['clients'].discard(client)
+            elif action == 'pause' and job['status'] == 'running':
+                if not job['thread'].can_pause():
+                    raise ValueError("边下边解压和选择性下载不支持暂停")
+                job['thread'].pause()
+            elif action == 'cancel' and job['status'] in ('running', 'paused'):
+                job['clients'].discard(client)
+                if client is not None and job['clients']:
+                    return job
+                if job['status'] == 'running':
+                    job['thread'].stop()
+                else:
+                    job['thread'].cancel_paused()
+                    job['status'], job['message'] = 'cancelled', "下载已取消"
+            elif action == 'resume' and job['status'] == 'paused':
+                if client is not None:
+                    job['clients'].add(client)
+                self.start_job(job)
+            else:
+                raise ValueError(f"任务当前状态为 {job['status']}, 无法执行 {action}")
+            return job
+    
+    def job_view(self, job, log_start=0):
+        """任务的JSON表示"""
+        with self.lock:
+            thread = job['thread']
+            return {
+                'id': job['id'],
+                'url': job['url'],
+                'save_path': job['save_path'],
+                'status': job['status'],
+                'message': job['message'],
+                'downloaded': thread.downloaded_size,
+                'total': thread.total_size,
+                'wire': thread.wire_size,
+                'compressed': thread.compressed,
+                'logs': job['logs'][log_start:],
+            }
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """下载服务的HTTP接口
+    
+    POST /jobs                      提交任务 {"url", "proxy", "save_folder", "threads", ...}
+    GET  /jobs                      列出所有任务
+    GET  /jobs/<id>                 查看任务
+    GET  /jobs/<id>/events?client=  持续推送任务进度(含后处理), 每行一个JSON
+    POST /jobs/<id>/pause|cancel|resume|detach  {"client"}
+    """
+    def log_message(self, format, *args):
+        pass
+    
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def check_client(self, json_body=False):
+        """只接受所有者的本机程序: 必须带令牌, 拒绝浏览器跨站请求(带Origin或非本机Host), POST必须是JSON"""
+        port = self.server.server_address[1]
+        token = self.headers.get('Authorization', '')
+        if not hmac.compare_digest(token.encode('utf-8'), f'Bearer {self.server.download_daemon.token}'.encode('utf-8')):
+            self.send_json({'error': '令牌无效'}, 401)
+            return False
+        if self.headers.get('Origin') is not None or \
+                self.headers.get('Host') not in (f'127.0.0.1:{port}', f'localhost:{port}'):
+            self.send_json({'error': '拒绝跨站请求'}, 403)
+            return False
+        if json_body and self.headers.get('Content-Type', '').split(';')[0].strip().lower() != 'application/json':
+            self.send_json({'error': '请求必须是 application/json'}, 415)
+            return False
+        return True
+    
+    def route(self):
+        """解析路径, 返回 (任务ID, 子操作)"""
+        parts = [p for p in self.path.split('?')[0].split('/') if p]
+        if not parts or parts[0] != 'jobs':
+            return None, None
+        job_id = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else None
+        return job_id, parts[2] if len(parts) > 2 else None
+    
+    def do_GET(self):
+        if not self.check_client():
+            return
+        daemon = self.server.download_daemon
+        job_id, action = self.route()
+        if job_id is None and self.path.split('?')[0].rstrip('/') == '/jobs':
+            with daemon.lock:
+                jobs = [daemon.job_view(job) for job in daemon.jobs.values()]
+            self.send_json(jobs)
+            return
+        with daemon.lock:
+            job = daemon.jobs.get(job_id)
+        if job is None:
+            self.send_json({'error': '任务不存在'}, 404)
+        elif action is None:
+            self.send_json(daemon.job_view(job))
+        elif action == 'events':
+            self.stream_events(daemon, job)
+        else:
+            self.send_json({'error': '未知操作'}, 404)
+    
+    def do_POST(self):
+        if not self.check_client(json_body=True):
+            return
+        daemon = self.server.download_daemon
+        job_id, action = self.route()
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if job_id is None and action is None:
+                job, deduplicated = daemon.submit(request)
+                self.send_json(dict(daemon.job_view(job), deduplicated=deduplicated))
+            else:
+                self.send_json(daemon.job_view(daemon.control(job_id, action, request.get('client'))))
+        except KeyError:
+            self.send_json({'error': '任务不存在'}, 404)
+        except Exception as e:
+            self.send_json({'error': str(e)}, 400)
+    
+    def stream_events(self, daemon, job):
+        """推送任务进度, 直到任务不再运行"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+        self.end_headers()
+        log_start = 0
+        try:
+            while True:
+                event = daemon.job_view(job, log_start)
+                log_start += len(event['logs'])
+                self.wfile.write(json.dumps(event, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+                if event['status'] not in ('running', 'processing'):
+                    break
+                time.sleep(0.5)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端断开后不再算作共享该任务
+            client = parse_qs(urlparse(self.path).query).get('client')
+            if client:
+                daemon.control(job['id'], 'detach', client[0])
+
+class RemoteDownload(QThread):
+    """提交到本地下载服务的任务, 接口与DownloadThread一致"""
+    progress_signal = pyqtSignal(int, int, int)
+    log_signal = pyqtSignal(str, str)
+    speed_signal = pyqtSignal(float)
+    finished_signal = pyqtSignal(bool, str)
+    
+    def __init__(self, request, port=DownloadDaemon.DEFAULT_PORT):
+        super().__init__()
+        self.request = request
+        self.port = port
+        self.base_url = f"http://127.0.0.1:{port}"
+        self.headers = {}
+        self.job_id = None
+        self.save_path = ''
+        self.total_size = 0
+        self.downloaded_size = 0
+        self.wire_size = 0
+        self.compressed = False
+        self.client_id = secrets.token_hex(8)
+        self.detached = False
+        self.cancelled = False
+    
+    def run(self):
+        try:
+            try:
+                self.headers = {'Authorization': f'Bearer {DownloadDaemon.read_token(self.port)}'}
+            except OSError:
+                self.log_signal.emit("找不到下载服务的令牌文件, 请先运行 --daemon", "error")
+                self.finished_signal.emit(False, "无法连接本地下载服务")
+                return
+            job = requests.post(f"{self.base_url}/jobs", json=dict(self.request, client=self.client_id),
+                                headers=self.headers, timeout=10).json()
+            if 'error' in job:
+                raise ValueError(job['error'])
+            self.job_id = job['id']
+            self.save_path = job['save_path']
+            if job['deduplicated']:
+                self.log_signal.emit("相同链接已在下载服务中, 共享该任务", "info")
+            
+            event = job
+            with requests.get(f"{self.base_url}/jobs/{self.job_id}/events", params={'client': self.client_id},
+                              headers=self.headers, stream=True, timeout=30) as response:
+                for line in response.iter_lines():
+                    if self.detached:
+                        return
+                    if self.cancelled:
+                        # 其他客户端共享的任务在服务中继续下载, 本客户端不再等待
+                        self.finished_signal.emit(False, "下载已取消")
+                        return
+                    if not line:
+                        continue
+                    event = json.loads(line)
+                    self.total_size = event['total']
+                    self.downloaded_size = event['downloaded']
+                    self.wire_size = event['wire']
+                    self.compressed = event['compressed']
+                    for level, message in event['logs']:
+                        self.log_signal.emit(message, level)
+                    progress = int((self.downloaded_size / self.total_size) * 100) if self.total_size > 0 else 0
+                    self.progress_signal.emit(progress, self.downloaded_size, self.total_size)
+            self.finished_signal.emit(event['status'] == 'done', event['message'])
+        except requests.ConnectionError:
+            self.log_signal.emit("无法连接本地下载服务, 请先运行 --daemon", "error")
+            self.finished_signal.emit(False, "无法连接本地下载服务")
+        except Exception as e:
+            self.log_signal.emit(f"下载服务错误: {str(e)}", "error")
+            self.finished_signal.emit(False, f"下载服务错误: {str(e)}")
+    
+    def control(self, action):
+        """向下载服务发送控制命令"""
+        if self.job_id is not None:
+            try:
+                requests.post(f"{self.base_url}/jobs/{self.job_id}/{action}", json={'client': self.client_id},
+                              headers=self.headers, timeout=5)
+            except Exception:
+                pass
+    
+    def stop(self):
+        """取消服务中的任务; 任务还被其他客户端共享时只断开本客户端"""
+        self.control('cancel')
+        self.cancelled = True
+    
+    def can_pause(self):
+        """与DownloadThread相同, 边下边解压和选择性下载不支持暂停"""
+        return not (self.request.get('extract_dir') or self.request.get('members'))
+    
+    def pause(self):
+        """暂停服务中的任务"""
+        self.control('pause')
+    
+    def detach(self):
+        """断开与任务的连接, 任务在服务中继续下载"""
+        self.detached = True
+        self.control('detach')
 
 class SimpleHeaderWidget(QFrame):
     """简洁标题栏组件"""
@@ -175,9 +1930,8 @@ class UrlInputWidget(QWidget):
         url_layout.setSpacing(10)
         
         self.prefix_combo = QComboBox()
-        self.prefix_combo.addItem("ghfast.top", "https://ghfast.top/")
-        self.prefix_combo.addItem("gh-proxy.net", "https://gh-proxy.net/")
-        self.prefix_combo.addItem("直连", "")
+        for name, prefix in PROXY_PREFIXES:
+            self.prefix_combo.addItem(name, prefix)
         self.prefix_combo.setFixedWidth(200)
         self.prefix_combo.setStyleSheet("""
             QComboBox {
@@ -345,6 +2099,123 @@ class SettingsWidget(QWidget):
         path_layout.addWidget(self.path_edit, 1)
         path_layout.addWidget(self.browse_button)
         layout.addLayout(path_layout)
+        
+        # zip选择性下载设置
+        member_layout = QHBoxLayout()
+        member_layout.setSpacing(10)
+        
+        member_label = QLabel("zip内文件:")
+        member_label.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        member_label.setFixedWidth(70)
+        
+        self.member_edit = QLineEdit()
+        self.member_edit.setPlaceholderText("只下载zip中匹配的文件, 如 */README.md, 多个用逗号分隔")
+        self.member_edit.setStyleSheet("""
+            QLineEdit {
+                font-family: 'Microsoft YaHei';
+                font-size: 14px;
+                padding: 8px 15px;
+                border: 1px solid #bdc3c7;
+                border-radius: 6px;
+                background: white;
+            }
+        """)
+        
+        member_layout.addWidget(member_label)
+        member_layout.addWidget(self.member_edit, 1)
+        layout.addLayout(member_layout)
+        
+        # 边下边解压设置
+        self.extract_check = QCheckBox("边下边解压 (codeload压缩包)")
+        self.extract_check.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        layout.addWidget(self.extract_check)
+        
+        # 增量更新设置
+        self.delta_check = QCheckBox("增量更新 (复用历史中的旧版本, 需发布 .blocks.json 块清单)")
+        self.delta_check.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        layout.addWidget(self.delta_check)
+        
+        # HTTP/2设置
+        http2_layout = QHBoxLayout()
+        http2_layout.setSpacing(10)
+        
+        self.http2_check = QCheckBox("HTTP/2 多路复用 (需安装 httpx[http2], 代理不支持时自动回退)")
+        self.http2_check.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        
+        http2_label = QLabel("连接数:")
+        http2_label.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        
+        # 所有分段共用这几个连接
+        self.http2_spin = QSpinBox()
+        self.http2_spin.setRange(1, 8)
+        self.http2_spin.setValue(1)
+        self.http2_spin.setFixedWidth(60)
+        self.http2_spin.setEnabled(False)
+        self.http2_check.toggled.connect(self.http2_spin.setEnabled)
+        
+        http2_layout.addWidget(self.http2_check)
+        http2_layout.addStretch()
+        http2_layout.addWidget(http2_label)
+        http2_layout.addWidget(self.http2_spin)
+        layout.addLayout(http2_layout)
+        
+        # 后处理设置
+        post_layout = QHBoxLayout()
+        post_layout.setSpacing(10)
+        
+        post_label = QLabel("后处理:")
+        post_label.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        post_label.setFixedWidth(70)
+        
+        self.post_edit = QLineEdit()
+        self.post_edit.setPlaceholderText("如 verify, extract, move:目标文件夹; 留空按 post_pipeline.json 规则")
+        self.post_edit.setStyleSheet("""
+            QLineEdit {
+                font-family: 'Microsoft YaHei';
+                font-size: 14px;
+                padding: 8px 15px;
+                border: 1px solid #bdc3c7;
+                border-radius: 6px;
+                background: white;
+            }
+        """)
+        
+        post_layout.addWidget(post_label)
+        post_layout.addWidget(self.post_edit, 1)
+        layout.addLayout(post_layout)
+        
+        # 下载服务设置
+        self.daemon_check = QCheckBox("提交到本地下载服务 (需先运行 --daemon)")
+        self.daemon_check.setStyleSheet("""
+            font-size: 14px;
+            color: #34495e;
+            font-family: 'Microsoft YaHei';
+        """)
+        layout.addWidget(self.daemon_check)
 
 class SpeedWidget(QWidget):
     """速度显示组件"""
@@ -483,6 +2354,36 @@ class ControlButtonsWidget(QWidget):
             }
         """)
         
+        self.pause_button = QPushButton("暂停下载")
+        self.pause_button.setFixedHeight(45)
+        self.pause_button.setEnabled(False)
+        self.pause_button.setStyleSheet("""
+            QPushButton {
+                font-family: 'Microsoft YaHei';
+                font-size: 16px;
+                font-weight: bold;
+                padding: 10px 30px;
+                border-radius: 8px;
+                background: #ecf0f1;
+                color: #2c3e50;
+                border: 2px solid #bdc3c7;
+            }
+            QPushButton:hover {
+                background: #f39c12;
+                color: white;
+                border-color: #f39c12;
+            }
+            QPushButton:pressed {
+                background: #d68910;
+                border-color: #d68910;
+            }
+            QPushButton:disabled {
+                background: #ecf0f1;
+                color: #bdc3c7;
+                border-color: #ecf0f1;
+            }
+        """)
+        
         self.stop_button = QPushButton("停止下载")
         self.stop_button.setFixedHeight(45)
         self.stop_button.setEnabled(False)
@@ -515,6 +2416,7 @@ class ControlButtonsWidget(QWidget):
         
         layout.addStretch()
         layout.addWidget(self.start_button)
+        layout.addWidget(self.pause_button)
         layout.addWidget(self.stop_button)
         layout.addStretch()
 
@@ -596,6 +2498,7 @@ class GithubDownloader(QMainWindow):
         self.download_thread = None
         self.download_history = []
         self.load_history()
+        self.post_processor = PostProcessor()
         self.setWindowIcon(QIcon(current_directory+'/app.ico'))
         self.init_ui()
         
@@ -680,10 +2583,12 @@ class GithubDownloader(QMainWindow):
         """连接信号和槽"""
         self.settings_widget.browse_button.clicked.connect(self.browse_folder)
         self.control_widget.start_button.clicked.connect(self.start_download)
+        self.control_widget.pause_button.clicked.connect(self.pause_download)
         self.control_widget.stop_button.clicked.connect(self.stop_download)
         self.log_widget.clear_button.clicked.connect(
             lambda: self.log_widget.log_text.clear()
         )
+        self.post_processor.log_signal.connect(self.add_log)
         
         default_path = os.path.expanduser("~/Downloads")
         self.settings_widget.path_edit.setText(default_path)
@@ -711,22 +2616,44 @@ class GithubDownloader(QMainWindow):
             return
             
         # 构建加速链接
-        if original_url.startswith('https://github.com/'):
-            accelerated_url = prefix + original_url[8:]
-        elif original_url.startswith('https://raw.githubusercontent.com/'):
-            accelerated_url = prefix + original_url[8:]
-        elif original_url.startswith('https://codeload.github.com/'):
-            accelerated_url = prefix + original_url[8:]
-        else:
+        accelerated_url = accelerate_url(original_url, prefix)
+        if accelerated_url is None:
             self.add_log("不支持的链接格式", "error")
             return
             
         # 生成文件名
-        file_name = os.path.basename(original_url.split('?')[0])
-        if not file_name:
-            file_name = f"download_{int(time.time())}.zip"
+        file_name = default_file_name(original_url)
         save_path = os.path.join(save_folder, file_name)
         
+        # 边下边解压目录
+        extract_dir = None
+        members = [p.strip() for p in self.settings_widget.member_edit.text().split(',') if p.strip()]
+        if members:
+            extract_dir = os.path.join(save_folder, os.path.splitext(file_name)[0])
+        elif self.settings_widget.extract_check.isChecked():
+            if original_url.startswith('https://codeload.github.com/'):
+                parts = original_url.split('?')[0][len('https://codeload.github.com/'):].split('/')
+                extract_dir = os.path.join(save_folder, f"{parts[1]}-{parts[-1]}" if len(parts) > 3 else file_name)
+            else:
+                self.add_log("边下边解压仅支持codeload压缩包, 将按普通方式下载", "warning")
+        
+        # 后处理步骤
+        post_stages = self.settings_widget.post_edit.text().strip()
+        try:
+            parse_post_stages(post_stages)
+        except ValueError as e:
+            self.add_log(str(e), "error")
+            return
+        
+        # 增量更新的旧版本文件
+        base_file = None
+        if self.settings_widget.delta_check.isChecked() and not extract_dir:
+            base_file = self.find_previous_download(original_url, file_name)
+            if base_file:
+                self.add_log(f"找到旧版本: {base_file}", "info")
+            else:
+                self.add_log("下载历史中没有旧版本, 将完整下载", "warning")
+        
         # 更新UI状态
         self.control_widget.start_button.setEnabled(False)
         self.control_widget.stop_button.setEnabled(True)
@@ -741,10 +2668,31 @@ class GithubDownloader(QMainWindow):
         self.add_log(f"加速链接: {accelerated_url}", "info")
         
         # 创建下载线程
-        self.download_thread = DownloadThread(accelerated_url, save_path, threads)
+        self.post_stages = post_stages or None
+        if self.settings_widget.daemon_check.isChecked():
+            if base_file and not DownloadDaemon.inside(base_file, os.path.realpath(save_folder)):
+                self.add_log("下载服务只接受保存文件夹内的旧版本, 将完整下载", "warning")
+                base_file = None
+            self.download_thread = RemoteDownload({
+                'url': original_url,
+                'proxy': prefix,
+                'save_folder': os.path.abspath(save_folder),
+                'threads': threads,
+                'extract_dir': extract_dir,
+                'members': members,
+                'base_file': base_file,
+                'use_http2': self.settings_widget.http2_check.isChecked(),
+                'http2_connections': self.settings_widget.http2_spin.value(),
+                'post_stages': self.post_stages,
+            })
+        else:
+            self.download_thread = DownloadThread(accelerated_url, save_path, threads, extract_dir, members, base_file,
+                                                  self.settings_widget.http2_check.isChecked(),
+                                                  self.settings_widget.http2_spin.value())
         self.download_thread.progress_signal.connect(self.update_progress)
         self.download_thread.log_signal.connect(self.add_log)
         self.download_thread.finished_signal.connect(self.download_finished)
+        self.control_widget.pause_button.setEnabled(self.download_thread.can_pause())
         
         # 手动计算速度
         self.last_downloaded = 0
@@ -758,6 +2706,22 @@ class GithubDownloader(QMainWindow):
         
         self.download_thread.start()
         
+    def find_previous_download(self, url, file_name):
+        """从下载历史中查找同一资源的旧版本文件"""
+        # 同一仓库的发布文件, 文件名去掉版本号后相同即视为同一资源
+        release_prefix = url.split('/releases/download/')[0] + '/releases/download/'
+        name_pattern = re.sub(r'\d+', '#', file_name)
+        for item in reversed(self.download_history):
+            path = item.get('path')
+            if not path or not os.path.isfile(path):
+                continue
+            if item['url'] == url:
+                return path
+            if ('/releases/download/' in url and item['url'].startswith(release_prefix)
+                    and re.sub(r'\d+', '#', os.path.basename(path)) == name_pattern):
+                return path
+        return None
+        
     def calculate_speed(self):
         """计算下载速度"""
         if self.download_thread and self.download_thread.isRunning():
@@ -777,6 +2741,14 @@ class GithubDownloader(QMainWindow):
                     progress = int((current / self.download_thread.total_size) * 100)
                     self.speed_widget.progress_label.setText(f"进度: {progress}%")
         
+    def pause_download(self):
+        """暂停下载, 再次开始时继续"""
+        if self.download_thread:
+            self.add_log("正在暂停下载...", "warning")
+            self.download_thread.pause()
+            if hasattr(self, 'speed_timer'):
+                self.speed_timer.stop()
+            
     def stop_download(self):
         """停止下载"""
         if self.download_thread:
@@ -792,9 +2764,10 @@ class GithubDownloader(QMainWindow):
         downloaded_str = self.format_size(downloaded)
         total_str = self.format_size(total)
         
-        self.progress_widget.detail_label.setText(
-            f"{downloaded_str} / {total_str} ({progress}%)"
-        )
+        detail = f"{downloaded_str} / {total_str} ({progress}%)"
+        if self.download_thread and self.download_thread.compressed:
+            detail += f"  传输: {self.format_size(self.download_thread.wire_size)}"
+        self.progress_widget.detail_label.setText(detail)
         
     def add_log(self, message, msg_type="info"):
         """添加日志"""
@@ -824,6 +2797,7 @@ class GithubDownloader(QMainWindow):
             self.speed_timer.stop()
             
         self.control_widget.start_button.setEnabled(True)
+        self.control_widget.pause_button.setEnabled(False)
         self.control_widget.stop_button.setEnabled(False)
         
         if success:
@@ -851,10 +2825,15 @@ class GithubDownloader(QMainWindow):
             self.download_history.append({
                 "url": self.url_widget.url_edit.text(),
                 "time": time.strftime("%Y-%m-%d %H:%M:%S"),
-                "size": self.download_thread.total_size if self.download_thread else 0
+                "size": self.download_thread.total_size if self.download_thread else 0,
+                "path": self.download_thread.save_path if self.download_thread and os.path.isfile(self.download_thread.save_path) else None
             })
             self.save_history()
             
+            # 下载服务中的任务由服务自己做后处理
+            if not isinstance(self.download_thread, RemoteDownload) and os.path.isfile(self.download_thread.save_path):
+                self.post_processor.submit(self.download_thread.save_path, self.post_stages)
+            
     def format_size(self, size):
         """格式化文件大小"""
         for unit in ['B', 'KB', 'MB', 'GB']:
@@ -865,14 +2844,37 @@ class GithubDownloader(QMainWindow):
             
     def closeEvent(self, event):
         """窗口关闭事件"""
-        if self.download_thread and self.download_thread.isRunning():
-            self.add_log("正在停止下载并关闭程序...", "warning")
-            self.download_thread.stop()
+        if isinstance(self.download_thread, RemoteDownload):
+            # 任务在下载服务中继续运行
+            self.download_thread.detach()
+            self.download_thread.wait(1000)
+        elif self.download_thread and self.download_thread.isRunning():
+            self.add_log("正在暂停下载并关闭程序...", "warning")
+            self.download_thread.pause()
+            self.download_thread.wait((DownloadThread.STOP_TIMEOUT + 1) * 1000)
         if hasattr(self, 'speed_timer'):
             self.speed_timer.stop()
+        self.post_processor.shutdown()
         event.accept()
 
 if __name__ == '__main__':
+    # 打包成exe后, spawn启动的后处理子进程需要由此进入
+    multiprocessing.freeze_support()
+    
+    # 生成增量更新用的块清单: python github-downloader.py --blockmap 文件
+    if len(sys.argv) == 3 and sys.argv[1] == '--blockmap':
+        with open(sys.argv[2] + '.blocks.json', 'w', encoding='utf-8') as f:
+            json.dump(BlockManifest.from_file(sys.argv[2]).to_json(), f)
+        sys.exit(0)
+    
+    # 以本地下载服务运行: python github-downloader.py --daemon [端口] [下载根目录]
+    if len(sys.argv) >= 2 and sys.argv[1] == '--daemon':
+        from PyQt5.QtCore import QCoreApplication
+        app = QCoreApplication(sys.argv)
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else DownloadDaemon.DEFAULT_PORT
+        DownloadDaemon(port, sys.argv[3] if len(sys.argv) > 3 else None).serve_forever()
+        sys.exit(0)
+    
     app = QApplication(sys.argv)
     
     # 设置应用程序字体
@@ -0,0 +1,149 @@
+"""停止/暂停的响应速度和暂停后继续下载的完整性测试
+
+用本地HTTP服务模拟卡住不再发送数据的代理, 运行: python -m pytest tests
+"""
+import importlib.util
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication, Qt
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+github_downloader = importlib.util.module_from_spec(spec)
+sys.modules['github_downloader'] = github_downloader
+spec.loader.exec_module(github_downloader)
+DownloadThread = github_downloader.DownloadThread
+
+DATA = os.urandom(4 * 1024 * 1024)
+FIRST_CHUNK = 64 * 1024
+
+
+class StallingHandler(BaseHTTPRequestHandler):
+    """支持范围请求; released未设置时每个响应只发送第一块数据就不再发送"""
+    protocol_version = 'HTTP/1.1'
+    released = threading.Event()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(DATA)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = 0, len(DATA) - 1
+        match = re.match(r'bytes=(\d+)-(\d+)', self.headers.get('Range', ''))
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        else:
+            self.send_response(200)
+        body = DATA[start:end + 1]
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body[:FIRST_CHUNK])
+            self.wfile.flush()
+            if not self.released.wait(60):
+                return
+            self.wfile.write(body[FIRST_CHUNK:])
+        except OSError:
+            pass
+
+
+class CancellationTest(unittest.TestCase):
+    # 停止时连接被立即关闭, run()应远早于STOP_TIMEOUT兜底期限返回
+    DEADLINE = 1.0
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StallingHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{cls.server.server_address[1]}/file.bin'
+
+    @classmethod
+    def tearDownClass(cls):
+        StallingHandler.released.set()
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        StallingHandler.released.clear()
+        DownloadThread.redirect_cache.clear()
+        self.folder = tempfile.mkdtemp()
+        self.save_path = os.path.join(self.folder, 'file.bin')
+
+    def tearDown(self):
+        StallingHandler.released.set()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def start(self):
+        """在普通线程中运行下载, 返回 (下载线程, 运行线程, 结果列表)"""
+        download = DownloadThread(self.url, self.save_path, threads=4)
+        results = []
+        # 运行线程没有Qt事件循环, 信号需要直接连接
+        download.finished_signal.connect(lambda success, message: results.append((success, message)),
+                                         Qt.DirectConnection)
+        runner = threading.Thread(target=download.run, daemon=True)
+        runner.start()
+        deadline = time.time() + 10
+        while download.downloaded_size < 4 * FIRST_CHUNK and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(download.downloaded_size, 4 * FIRST_CHUNK)
+        return download, runner, results
+
+    def stop_and_wait(self, download, runner, keep_parts):
+        started = time.time()
+        if keep_parts:
+            download.pause()
+        else:
+            download.stop()
+        runner.join(self.DEADLINE)
+        self.assertFalse(runner.is_alive(), "run() 在停止后没有及时返回")
+        self.assertLess(time.time() - started, self.DEADLINE)
+
+    def leftovers(self):
+        return sorted(name for name in os.listdir(self.folder) if name != 'file.bin')
+
+    def test_stop_returns_promptly_and_discards_parts(self):
+        download, runner, results = self.start()
+        self.stop_and_wait(download, runner, keep_parts=False)
+        self.assertEqual(results, [(False, "下载已取消")])
+        self.assertEqual(self.leftovers(), [])
+        self.assertFalse(os.path.exists(self.save_path))
+
+    def test_pause_returns_promptly_and_resume_is_identical(self):
+        download, runner, results = self.start()
+        self.stop_and_wait(download, runner, keep_parts=True)
+        self.assertEqual(results, [(False, "下载已暂停")])
+        self.assertEqual(self.leftovers(), [f'file.bin.part{i}' for i in range(4)] + ['file.bin.state.json'])
+
+        StallingHandler.released.set()
+        resumed = DownloadThread(self.url, self.save_path, threads=4)
+        results = []
+        resumed.finished_signal.connect(lambda success, message: results.append((success, message)))
+        resumed.run()
+        self.assertEqual(results, [(True, "下载完成")])
+        self.assertEqual(self.leftovers(), [])
+        with open(self.save_path, 'rb') as f:
+            self.assertTrue(f.read() == DATA, "继续下载后的文件与原文件不一致")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+"""压缩传输的完整性检查测试
+
+用本地HTTP服务返回不完整的gzip数据, 运行: python -m pytest tests
+"""
+import gzip
+import importlib.util
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+if 'github_downloader' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+    sys.modules['github_downloader'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['github_downloader'])
+github_downloader = sys.modules['github_downloader']
+DownloadThread = github_downloader.DownloadThread
+
+DATA = b''.join(b'%d,row,value\n' % i for i in range(100000))
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    """HEAD报告完整大小, GET按路径返回完整、截断或内容不足的gzip数据"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/csv')
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+
+    def do_GET(self):
+        if self.path == '/short.csv':
+            body = gzip.compress(DATA[:len(DATA) // 2])
+        else:
+            body = gzip.compress(DATA)
+        if self.path == '/truncated.csv':
+            body = body[:len(body) // 2]
+        self.send_response(200)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class CompressedTransferTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        DownloadThread.redirect_cache.clear()
+        self.folder = tempfile.mkdtemp()
+        self.save_path = os.path.join(self.folder, 'data.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def download(self, name):
+        download = DownloadThread(f'{self.base}/{name}', self.save_path, threads=4)
+        results = []
+        download.finished_signal.connect(lambda success, message: results.append((success, message)))
+        download.run()
+        return download, results
+
+    def test_complete_stream_is_saved(self):
+        download, results = self.download('full.csv')
+        self.assertEqual(results, [(True, "下载完成")])
+        self.assertTrue(download.compressed)
+        with open(self.save_path, 'rb') as f:
+            self.assertTrue(f.read() == DATA)
+
+    def test_incomplete_streams_fail_without_leftovers(self):
+        for name in ('truncated.csv', 'short.csv'):
+            download, results = self.download(name)
+            self.assertEqual(len(results), 1, name)
+            self.assertFalse(results[0][0], name)
+            self.assertIn("不完整", results[0][1], name)
+            self.assertEqual(os.listdir(self.folder), [], name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+"""下载服务的访问控制和任务参数校验测试
+
+运行: python -m pytest tests
+"""
+import importlib.util
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+import requests
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication, Qt
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+if 'github_downloader' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+    sys.modules['github_downloader'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['github_downloader'])
+github_downloader = sys.modules['github_downloader']
+DownloadDaemon = github_downloader.DownloadDaemon
+
+URL = 'https://github.com/u/r/releases/download/v1/a.bin'
+
+
+class FakeThread:
+    """代替下载线程, 任务一直处于下载中, 不访问网络"""
+    downloaded_size = total_size = wire_size = 0
+    compressed = False
+    paused = False
+
+    def __init__(self):
+        self.stopped = False
+
+    def stop(self):
+        self.stopped = True
+
+
+class DaemonTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.root = os.path.join(self.folder, 'downloads')
+        self.outside = os.path.join(self.folder, 'outside')
+        os.makedirs(os.path.join(self.root, 'sub'))
+        os.makedirs(self.outside)
+        self.token_dir = DownloadDaemon.TOKEN_DIR
+        DownloadDaemon.TOKEN_DIR = os.path.join(self.folder, 'tokens')
+        self.daemon = DownloadDaemon(0, self.root)
+        self.server = None
+
+    def tearDown(self):
+        DownloadDaemon.TOKEN_DIR = self.token_dir
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def start_server(self):
+        self.server = self.daemon.create_server()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return f'http://127.0.0.1:{self.daemon.port}/jobs'
+
+    def assertRejected(self, **request):
+        request = dict({'url': URL, 'proxy': '', 'save_folder': self.root}, **request)
+        with self.assertRaises(ValueError):
+            self.daemon.submit(request)
+        self.assertEqual(self.daemon.jobs, {})
+
+    def test_token_file_is_owner_only(self):
+        self.start_server()
+        path = DownloadDaemon.token_file(self.daemon.port)
+        self.assertEqual(DownloadDaemon.read_token(self.daemon.port), self.daemon.token)
+        if os.name == 'posix':
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+            self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+
+    def test_requests_need_token(self):
+        url = self.start_server()
+        self.assertEqual(requests.get(url).status_code, 401)
+        self.assertEqual(requests.get(url, headers={'Authorization': 'Bearer wrong'}).status_code, 401)
+        self.assertEqual(requests.post(url, json={'url': URL}).status_code, 401)
+        headers = {'Authorization': f'Bearer {self.daemon.token}'}
+        self.assertEqual(requests.get(url, headers=headers).json(), [])
+        cross_site = dict(headers, Origin='http://example.com')
+        self.assertEqual(requests.get(url, headers=cross_site).status_code, 403)
+        response = requests.post(url, data='{}', headers=dict(headers, **{'Content-Type': 'text/plain'}))
+        self.assertEqual(response.status_code, 415)
+
+    def test_save_folder_must_be_inside_root(self):
+        self.assertRejected(save_folder=self.outside)
+        self.assertRejected(save_folder=os.path.join(self.root, '..', 'outside'))
+        self.assertRejected(save_folder='downloads')
+        link = os.path.join(self.root, 'link')
+        os.symlink(self.outside, link)
+        self.assertRejected(save_folder=link)
+
+    def test_file_name_must_be_plain(self):
+        for name in ('.bashrc', '..', '../../tmp/evil', 'sub/a.bin', 'sub\\a.bin'):
+            self.assertRejected(file_name=name)
+
+    def test_post_stage_targets_must_be_inside_root(self):
+        self.assertRejected(post_stages='move:/etc/cron.d')
+        self.assertRejected(post_stages=f'extract:{self.outside}')
+        self.assertRejected(post_stages='move:relative')
+        self.assertRejected(post_stages='unknown')
+
+    def test_other_options_are_checked(self):
+        self.assertRejected(proxy='http://attacker/')
+        self.assertRejected(url='https://example.com/a.bin')
+        self.assertRejected(extract_dir=self.outside)
+        self.assertRejected(base_file='/etc/passwd')
+        self.assertRejected(threads=0)
+        self.assertRejected(threads='x')
+        self.assertRejected(http2_connections=9)
+        self.assertRejected(http2_connections=0)
+        self.assertRejected(members='*.txt')
+
+    def fake_jobs(self):
+        self.daemon.start_job = lambda job: job.update(thread=FakeThread(), status='running', message='下载中')
+
+    def test_members_default_to_extract_dir_named_after_file(self):
+        self.fake_jobs()
+        job, _ = self.daemon.submit({'url': URL, 'proxy': '', 'save_folder': self.root, 'file_name': 'pkg.zip',
+                                     'members': ['docs/*']})
+        self.assertEqual(job['options']['extract_dir'], os.path.join(self.root, 'pkg'))
+
+    def test_cancel_from_shared_client_only_detaches(self):
+        self.fake_jobs()
+        request = {'url': URL, 'proxy': '', 'save_folder': self.root}
+        job, deduplicated = self.daemon.submit(dict(request, client='a'))
+        self.assertFalse(deduplicated)
+        self.assertEqual(self.daemon.submit(dict(request, client='b')), (job, True))
+        self.daemon.control(job['id'], 'cancel', 'a')
+        self.assertEqual(job['status'], 'running')
+        self.assertFalse(job['thread'].stopped)
+        self.daemon.control(job['id'], 'cancel', 'b')
+        self.assertTrue(job['thread'].stopped)
+
+    def test_remote_cancel_stops_waiting_while_shared_job_continues(self):
+        self.fake_jobs()
+        self.start_server()
+        request = {'url': URL, 'proxy': '', 'save_folder': self.root}
+        job, _ = self.daemon.submit(dict(request, client='other'))
+        remote = github_downloader.RemoteDownload(request, self.daemon.port)
+        results = []
+        remote.finished_signal.connect(lambda success, message: results.append((success, message)),
+                                       Qt.DirectConnection)
+        runner = threading.Thread(target=remote.run, daemon=True)
+        runner.start()
+        deadline = time.time() + 10
+        while remote.client_id not in job['clients'] and time.time() < deadline:
+            time.sleep(0.05)
+        remote.stop()
+        runner.join(5)
+        self.assertFalse(runner.is_alive())
+        self.assertEqual(results, [(False, "下载已取消")])
+        self.assertEqual(job['status'], 'running')
+        self.assertEqual(job['clients'], {'other'})
+
+    def test_reported_payload_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.daemon.submit({'url': 'https://raw.githubusercontent.com/evil/x/main/payload', 'proxy': '',
+                                'save_folder': os.path.expanduser('~'), 'file_name': '.bashrc',
+                                'post_stages': 'move:/etc/cron.d'})
+
+
+if __name__ == '__main__':
+    unittest.main()
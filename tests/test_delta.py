@@ -0,0 +1,88 @@
+"""增量更新的块匹配和下载范围划分测试
+
+运行: python -m pytest tests
+"""
+import importlib.util
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+if 'github_downloader' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+    sys.modules['github_downloader'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['github_downloader'])
+github_downloader = sys.modules['github_downloader']
+BlockManifest = github_downloader.BlockManifest
+DownloadThread = github_downloader.DownloadThread
+
+BLOCK_SIZE = 4096
+
+
+class BlockMatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.random = random.Random(1)
+        self.old = self.random.randbytes(64 * BLOCK_SIZE)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def match(self, new):
+        new_path = os.path.join(self.folder, 'new.bin')
+        old_path = os.path.join(self.folder, 'old.bin')
+        with open(new_path, 'wb') as f:
+            f.write(new)
+        with open(old_path, 'wb') as f:
+            f.write(self.old)
+        manifest = BlockManifest.from_file(new_path, BLOCK_SIZE)
+        found = manifest.match(old_path)
+        for index, offset in found.items():
+            start, end = manifest.block_range(index)
+            self.assertEqual(self.old[offset:offset + end - start + 1], new[start:end + 1])
+        return manifest, found
+
+    def test_identical_file_is_matched_in_place(self):
+        manifest, found = self.match(self.old)
+        self.assertEqual(found, {index: index * BLOCK_SIZE for index in range(64)})
+
+    def test_blocks_after_an_insertion_are_found_at_shifted_offsets(self):
+        new = self.old[:10 * BLOCK_SIZE] + self.random.randbytes(777) + self.old[10 * BLOCK_SIZE:]
+        manifest, found = self.match(new)
+        # 只有包含插入内容的两个块需要下载
+        self.assertEqual(len(found), len(manifest.blocks) - 2)
+        self.assertEqual(found[11], 11 * BLOCK_SIZE - 777)
+        self.assertEqual(found[63], 63 * BLOCK_SIZE - 777)
+
+    def test_changed_and_appended_blocks_are_missing(self):
+        new = bytearray(self.old + self.random.randbytes(3 * BLOCK_SIZE))
+        new[20 * BLOCK_SIZE + 5] ^= 0xFF
+        manifest, found = self.match(bytes(new))
+        self.assertEqual(sorted(set(range(len(manifest.blocks))) - set(found)), [20, 64, 65, 66])
+
+
+class MissingRangesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manifest = BlockManifest(BLOCK_SIZE, 100 * BLOCK_SIZE - 10, [[0, '']] * 100)
+
+    def test_large_change_is_split_between_threads(self):
+        ranges = DownloadThread('http://127.0.0.1/a.bin', '/tmp/a.bin', threads=4).missing_ranges(self.manifest, {})
+        self.assertEqual([(first, last) for first, last, _, _ in ranges], [(0, 24), (25, 49), (50, 74), (75, 99)])
+        self.assertEqual(ranges[-1][3], 100 * BLOCK_SIZE - 11)
+
+    def test_consecutive_missing_blocks_are_merged(self):
+        found = {index: index * BLOCK_SIZE for index in range(100) if index not in (3, 4, 5, 50)}
+        ranges = DownloadThread('http://127.0.0.1/a.bin', '/tmp/a.bin', threads=1).missing_ranges(self.manifest, found)
+        self.assertEqual(ranges, [(3, 5, 3 * BLOCK_SIZE, 6 * BLOCK_SIZE - 1),
+                                  (50, 50, 50 * BLOCK_SIZE, 51 * BLOCK_SIZE - 1)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+"""选择性下载和压缩包解压的测试
+
+用本地HTTP服务提供压缩包和范围请求, 压缩包在测试中构造, 包括指向解压目录外的链接和zip64目录,
+运行: python -m pytest tests
+"""
+import importlib.util
+import io
+import os
+import re
+import shutil
+import struct
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+import zlib
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+if 'github_downloader' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+    sys.modules['github_downloader'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['github_downloader'])
+github_downloader = sys.modules['github_downloader']
+DownloadThread = github_downloader.DownloadThread
+
+
+def build_zip(members, compression=zipfile.ZIP_STORED):
+    """在内存中生成zip, members为 {名称: 内容}"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    return buffer.getvalue()
+
+
+def build_tar(entries):
+    """生成tar.gz, entries为 (名称, 类型, 内容或链接目标) 列表, 类型为 file/dir/sym/hard"""
+    types = {'file': tarfile.REGTYPE, 'dir': tarfile.DIRTYPE, 'sym': tarfile.SYMTYPE, 'hard': tarfile.LNKTYPE}
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, kind, value in entries:
+            info = tarfile.TarInfo(name)
+            info.type = types[kind]
+            info.mode = 0o755 if kind == 'dir' else 0o644
+            if kind == 'file':
+                info.size = len(value)
+                archive.addfile(info, io.BytesIO(value))
+                continue
+            if kind in ('sym', 'hard'):
+                info.linkname = value
+            archive.addfile(info)
+    return buffer.getvalue()
+
+
+def build_zip64(name, data):
+    """手工生成只有一个存储条目的zip64文件: 中央目录中的大小和偏移都放在zip64扩展字段里"""
+    raw_name = name.encode('utf-8')
+    crc = zlib.crc32(data)
+    local = struct.pack('<4s5H3L2H', b'PK\x03\x04', 45, 0x800, 0, 0, 0, crc, len(data), len(data),
+                        len(raw_name), 0) + raw_name + data
+    extra = struct.pack('<2H', 0x5455, 5) + b'\x01\x00\x00\x00\x00' + \
+        struct.pack('<2H3Q', 0x0001, 24, len(data), len(data), 0)
+    central = struct.pack('<4s6H3L5H2L', b'PK\x01\x02', 45, 45, 0x800, 0, 0, 0, crc, 0xFFFFFFFF, 0xFFFFFFFF,
+                          len(raw_name), len(extra), 0, 0, 0, 0, 0xFFFFFFFF) + raw_name + extra
+    record_offset = len(local) + len(central)
+    record = struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0, 1, 1, len(central), len(local))
+    locator = struct.pack('<4sLQL', b'PK\x06\x07', 0, record_offset, 1)
+    end = struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, 0xFFFF, 0xFFFF, 0xFFFFFFFF, 0xFFFFFFFF, 0)
+    return local + central + record + locator + end
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """按Range返回archive; 从failing_offset开始的请求返回500, slow为True时条目数据缓慢发送"""
+    protocol_version = 'HTTP/1.1'
+    archive = b''
+    failing_offset = None
+    slow = False
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.archive)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        size = len(self.archive)
+        match = re.match(r'bytes=(\d*)-(\d*)', self.headers.get('Range', ''))
+        if not match:
+            self.send_response(200)
+            self.send_header('Content-Length', str(size))
+            self.end_headers()
+            self.wfile.write(self.archive)
+            return
+        if not match.group(1):
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        if start == self.failing_offset:
+            self.send_response(500)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = self.archive[start:end + 1]
+        self.send_response(206)
+        self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        # 读取中央目录的尾部请求总是立即返回
+        step = 4096 if self.slow and end < size - 1 else len(body)
+        try:
+            for i in range(0, len(body), step):
+                self.wfile.write(body[i:i + step])
+                if step != len(body):
+                    time.sleep(0.05)
+        except OSError:
+            pass
+
+
+class ArchiveServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        DownloadThread.redirect_cache.clear()
+        RangeHandler.failing_offset = None
+        RangeHandler.slow = False
+        self.folder = tempfile.mkdtemp()
+        self.extract_dir = os.path.join(self.folder, 'archive')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def serve(self, members, compression=zipfile.ZIP_STORED):
+        RangeHandler.archive = build_zip(members, compression)
+        return zipfile.ZipFile(io.BytesIO(RangeHandler.archive))
+
+    def run_download(self, members=None, threads=4, name='archive.zip'):
+        download = DownloadThread(f'{self.base}/{name}', os.path.join(self.folder, name), threads,
+                                  self.extract_dir, members)
+        results = []
+        self.logs = []
+        download.finished_signal.connect(lambda success, message: results.append((success, message)))
+        download.log_signal.connect(lambda message, level: self.logs.append((level, message)))
+        download.run()
+        return results
+
+
+class SelectiveDownloadTest(ArchiveServerTest):
+
+    def test_selected_members_are_extracted(self):
+        archive = self.serve({'bin/tool.txt': b'tool\n' * 1000, 'bin/lib.dll': os.urandom(5000),
+                              'docs/readme.md': b'readme'}, zipfile.ZIP_DEFLATED)
+        self.assertEqual(self.run_download(['bin/*']), [(True, "下载完成")])
+        for name in ('bin/tool.txt', 'bin/lib.dll'):
+            with open(os.path.join(self.extract_dir, name), 'rb') as f:
+                self.assertTrue(f.read() == archive.read(name), name)
+        self.assertFalse(os.path.exists(os.path.join(self.extract_dir, 'docs')))
+
+    def test_first_error_stops_other_members_and_is_reported(self):
+        archive = self.serve({f'data/{i}.bin': os.urandom(256 * 1024) for i in range(6)})
+        RangeHandler.failing_offset = archive.getinfo('data/1.bin').header_offset
+        RangeHandler.slow = True
+        started = time.time()
+        results = self.run_download(['data/*'], threads=2)
+        # 每个条目需要3秒以上才能发送完, 出错后不应等待其余条目
+        self.assertLess(time.time() - started, 5)
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0][0])
+        self.assertIn("选择性下载错误", results[0][1])
+        self.assertIn("500", results[0][1])
+
+
+class TarLinkTest(ArchiveServerTest):
+
+    def extract(self, entries):
+        RangeHandler.archive = build_tar(entries)
+        self.assertEqual(self.run_download(name='archive.tar.gz'), [(True, "下载完成")])
+
+    def assertConfined(self):
+        """解压目录外没有写入任何文件, 解压出的每个符号链接都指向解压目录内"""
+        self.assertEqual(os.listdir(self.folder), ['archive'])
+        real_base = os.path.realpath(self.extract_dir)
+        for folder, dirs, files in os.walk(self.extract_dir):
+            for name in dirs + files:
+                path = os.path.join(folder, name)
+                if os.path.islink(path):
+                    self.assertEqual(os.path.commonpath([real_base, os.path.realpath(path)]), real_base, path)
+
+    def skipped(self):
+        return [message for level, message in self.logs if level == 'warning' and '解压目录外' in message]
+
+    def test_absolute_and_parent_links_are_skipped(self):
+        self.extract([('f.txt', 'file', b'inside'), ('abs', 'sym', '/etc/passwd'), ('hard', 'hard', '/etc/passwd'),
+                      ('up', 'sym', '../x'), ('deep/', 'dir', None), ('deep/up', 'sym', '../../x'),
+                      ('ok', 'sym', 'f.txt'), ('copy', 'hard', 'f.txt')])
+        for name in ('abs', 'hard', 'up', 'deep/up'):
+            self.assertFalse(os.path.lexists(os.path.join(self.extract_dir, name)), name)
+        self.assertEqual(len(self.skipped()), 4)
+        for name in ('ok', 'copy'):
+            with open(os.path.join(self.extract_dir, name), 'rb') as f:
+                self.assertEqual(f.read(), b'inside')
+        self.assertConfined()
+
+    def test_link_chain_through_later_link_cannot_escape(self):
+        self.extract([('A', 'sym', 'd/../../x'), ('d', 'sym', '.'), ('A', 'file', b'payload')])
+        self.assertConfined()
+        self.assertEqual(len(self.skipped()), 1)
+
+    def test_link_rewritten_before_its_directory_becomes_a_link(self):
+        # sub/A 按字面指向 sub/x, sub/d 之后变成指向上一级的链接, 按字面解析 sub/A 会指到解压目录外
+        self.extract([('sub/', 'dir', None), ('sub/A', 'sym', 'd/../x'), ('sub/d', 'sym', '..'),
+                      ('sub/A', 'file', b'payload')])
+        self.assertConfined()
+        with open(os.path.join(self.extract_dir, 'sub', 'x'), 'rb') as f:
+            self.assertEqual(f.read(), b'payload')
+
+    def test_links_under_a_symlinked_directory(self):
+        self.extract([('f.txt', 'file', b'inside'), ('real/', 'dir', None), ('alias', 'sym', 'real'),
+                      ('alias/up', 'sym', '../../x'), ('alias/ok', 'sym', '../f.txt'),
+                      ('alias/g.txt', 'file', b'through alias')])
+        self.assertFalse(os.path.lexists(os.path.join(self.extract_dir, 'real', 'up')))
+        self.assertEqual(len(self.skipped()), 1)
+        with open(os.path.join(self.extract_dir, 'real', 'ok'), 'rb') as f:
+            self.assertEqual(f.read(), b'inside')
+        with open(os.path.join(self.extract_dir, 'real', 'g.txt'), 'rb') as f:
+            self.assertEqual(f.read(), b'through alias')
+        self.assertConfined()
+
+
+class ZipDirectoryTest(ArchiveServerTest):
+
+    def read_directory(self):
+        download = DownloadThread(f'{self.base}/archive.zip', os.path.join(self.folder, 'archive.zip'), 4,
+                                  self.extract_dir)
+        return download, download.read_zip_directory()
+
+    def test_central_directory_matches_zipfile(self):
+        archive = self.serve({'a.txt': b'a' * 1000, 'dir/': b'', 'dir/b.bin': os.urandom(3000),
+                              '中文.txt': b'utf-8 name'}, zipfile.ZIP_DEFLATED)
+        download, entries = self.read_directory()
+        self.assertEqual(download.total_size, len(RangeHandler.archive))
+        expected = [{'name': info.filename, 'method': info.compress_type, 'crc': info.CRC, 'size': info.file_size,
+                     'compressed_size': info.compress_size, 'offset': info.header_offset}
+                    for info in archive.infolist()]
+        self.assertEqual(entries, expected)
+
+    def test_zip64_directory_and_extra_field(self):
+        data = os.urandom(10000)
+        RangeHandler.archive = build_zip64('big/data.bin', data)
+        # 先确认构造的文件本身是合法的zip64
+        self.assertEqual(zipfile.ZipFile(io.BytesIO(RangeHandler.archive)).read('big/data.bin'), data)
+        _, entries = self.read_directory()
+        self.assertEqual(entries, [{'name': 'big/data.bin', 'method': 0, 'crc': zlib.crc32(data), 'size': len(data),
+                                    'compressed_size': len(data), 'offset': 0}])
+        self.assertEqual(self.run_download(), [(True, "下载完成")])
+        with open(os.path.join(self.extract_dir, 'big', 'data.bin'), 'rb') as f:
+            self.assertTrue(f.read() == data)
+
+    def test_zip64_extra_only_holds_overflowing_fields(self):
+        download = DownloadThread('http://127.0.0.1/a.zip', '/tmp/a.zip', 4, '/tmp/a')
+        timestamp = struct.pack('<2H', 0x5455, 5) + b'\x01\x00\x00\x00\x00'
+        offset_only = timestamp + struct.pack('<2HQ', 0x0001, 8, 5 * 1024 ** 3)
+        self.assertEqual(download.parse_zip64_extra(offset_only, 10, 20, 0xFFFFFFFF), (10, 20, 5 * 1024 ** 3))
+        sizes_only = struct.pack('<2H2Q', 0x0001, 16, 6 * 1024 ** 3, 4 * 1024 ** 3)
+        self.assertEqual(download.parse_zip64_extra(sizes_only, 0xFFFFFFFF, 0xFFFFFFFF, 30),
+                         (6 * 1024 ** 3, 4 * 1024 ** 3, 30))
+
+
+class SafePathTest(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.extract_dir = os.path.join(self.folder, 'archive')
+        os.makedirs(os.path.join(self.extract_dir, 'sub'))
+        os.makedirs(os.path.join(self.folder, 'outside'))
+        self.download = DownloadThread('http://127.0.0.1/a.zip', os.path.join(self.folder, 'a.zip'), 4,
+                                       self.extract_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_paths_inside_extract_dir_are_allowed(self):
+        for name in ('a.txt', 'sub/a.txt', 'sub/../a.txt', 'new/dir/a.txt'):
+            self.assertEqual(self.download.safe_path(name), os.path.abspath(os.path.join(self.extract_dir, name)))
+
+    def test_escaping_paths_are_rejected(self):
+        os.symlink(os.path.join(self.folder, 'outside'), os.path.join(self.extract_dir, 'out'))
+        os.symlink('..', os.path.join(self.extract_dir, 'sub', 'parent'))
+        for name in ('/etc/passwd', '../x', 'sub/../../x', 'out/a.txt', 'out/../../x'):
+            with self.assertRaises(ValueError, msg=name):
+                self.download.safe_path(name)
+        # 指向解压目录内的符号链接可以使用; ..先按字面消去, 返回的路径不会经过链接再回到上一级
+        self.assertTrue(self.download.safe_path('sub/parent/a.txt'))
+        self.assertEqual(self.download.safe_path('sub/parent/../x'), os.path.join(self.extract_dir, 'sub', 'x'))
+
+
+if __name__ == '__main__':
+    unittest.main()
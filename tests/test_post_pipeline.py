@@ -0,0 +1,88 @@
+"""后处理步骤解析和规则文件的测试
+
+运行: python -m pytest tests
+"""
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QCoreApplication, Qt
+
+MODULE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'github-downloader.py')
+if 'github_downloader' not in sys.modules:
+    spec = importlib.util.spec_from_file_location('github_downloader', MODULE_PATH)
+    sys.modules['github_downloader'] = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sys.modules['github_downloader'])
+github_downloader = sys.modules['github_downloader']
+PostProcessor = github_downloader.PostProcessor
+
+
+class RulesFileTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.rules_file = PostProcessor.RULES_FILE
+        PostProcessor.RULES_FILE = os.path.join(self.folder, 'post_pipeline.json')
+        self.processor = PostProcessor()
+        self.logs = []
+        self.processor.log_signal.connect(lambda message, level: self.logs.append((level, message)),
+                                          Qt.DirectConnection)
+
+    def tearDown(self):
+        PostProcessor.RULES_FILE = self.rules_file
+        self.processor.shutdown()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def write_rules(self, text):
+        with open(PostProcessor.RULES_FILE, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def test_rules_are_matched_by_file_name(self):
+        self.write_rules(json.dumps([{'pattern': '*.zip', 'stages': 'verify, extract'},
+                                     {'pattern': '*', 'stages': ['verify']}]))
+        self.assertEqual(self.processor.stages_for('/tmp/a.zip'), [('verify', None), ('extract', None)])
+        self.assertEqual(self.processor.stages_for('/tmp/a.bin'), [('verify', None)])
+        self.assertEqual(self.processor.stages_for('/tmp/a.bin', 'move:/tmp/x'), [('move', '/tmp/x')])
+
+    def test_missing_rules_file_means_no_stages(self):
+        self.assertIsNone(self.processor.submit('/tmp/a.zip'))
+        self.assertEqual(self.logs, [])
+
+    def test_malformed_rules_are_logged_without_stages(self):
+        for text in ('{"pattern": "*"}', '[{"stages": "verify"}]', '[{"pattern": "*"}]', '["verify"]',
+                     '[{"pattern": "*", "stages": 1}]', '[{"pattern": "*", "stages": "unknown"}]', 'not json'):
+            self.logs = []
+            self.write_rules(text)
+            self.assertIsNone(self.processor.submit('/tmp/a.zip'), text)
+            self.assertEqual([level for level, _ in self.logs], ['error'], text)
+
+
+class StageExtractTargetTest(unittest.TestCase):
+
+    def test_target_is_derived_from_the_file_name_only(self):
+        folder = tempfile.mkdtemp()
+        try:
+            downloads = os.path.join(folder, 'john.doe', 'Downloads')
+            os.makedirs(downloads)
+            for name, expected in (('main', 'main_files'), ('pkg.tar.gz', 'pkg'), ('pkg.zip', 'pkg')):
+                path = os.path.join(downloads, name)
+                shutil.make_archive(path, 'zip', folder, 'john.doe')
+                os.replace(path + '.zip', path)
+                target, _ = github_downloader.stage_extract(path)
+                self.assertEqual(target, os.path.join(downloads, expected))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    unittest.main()